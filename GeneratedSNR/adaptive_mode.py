@@ -0,0 +1,121 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+# the mixing engine lives at the repository root, one level above the player
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+from corpus_catalog import open_catalog  # noqa: E402
+from mixing_engine import MixKernel, calculate_rms  # noqa: E402
+from wav_reader import open_wav, read_amplitude  # noqa: E402
+
+ADAPTIVE_MASKER = 'PinkNoise'
+# glob patterns matched against the corpus catalog of the repository root
+MASKERS = {
+    'PinkNoise': os.path.join(REPO_ROOT, 'Noise', 'Concat_p*_Nz.wav'),
+    'Environment': os.path.join(REPO_ROOT, 'Environment', '*.wav'),
+    'SingleTalker': os.path.join(REPO_ROOT, 'Sentences', '*', '*.wav'),
+}
+
+
+class Staircase:
+    """Transformed up-down staircase on SNR.
+
+    ``n_down`` correct answers in a row lower the SNR by one step and every
+    miss raises it, so the default 2-down 1-up rule converges on 70.7%
+    correct. The step drops to ``min_step`` after the first two reversals.
+    """
+
+    def __init__(self, start=0.0, step=4.0, min_step=2.0, n_down=2, floor=-30.0, ceiling=20.0, max_reversals=8):
+        self.snr = start
+        self.step = step
+        self.min_step = min_step
+        self.n_down = n_down
+        self.floor = floor
+        self.ceiling = ceiling
+        self.max_reversals = max_reversals
+        self.reversals = []
+        self._run = 0
+        self._direction = 0
+
+    @property
+    def done(self):
+        return len(self.reversals) >= self.max_reversals
+
+    def update(self, correct):
+        """Record a response and return the SNR for the next trial."""
+        if correct:
+            self._run += 1
+            if self._run < self.n_down:
+                return self.snr
+            direction = -1
+        else:
+            direction = 1
+        self._run = 0
+
+        if self._direction and direction != self._direction:
+            self.reversals.append(self.snr)
+            if len(self.reversals) >= 2:
+                self.step = self.min_step
+        self._direction = direction
+        self.snr = min(max(self.snr + direction * self.step, self.floor), self.ceiling)
+        return self.snr
+
+    def threshold(self):
+        """Mean SNR of the reversals after the first two, or NaN before there are any."""
+        if len(self.reversals) <= 2:
+            return float('nan')
+        return float(np.mean(self.reversals[2:]))
+
+
+class AdaptiveMixer:
+    """Hold clean words and maskers in memory and mix one trial at any SNR.
+
+    Clean words are kept as float64 with their RMS measured once; maskers are
+    copied into RAM as int16, so a trial only converts its word-length
+    segment to float before the reused MixKernel mixes it. Every word must
+    share one sample rate and channel count, which the maskers are filtered
+    by and the mixer should be opened in.
+    """
+
+    def __init__(self, clean_paths, noise_mode=ADAPTIVE_MASKER, seed=None):
+        if not clean_paths:
+            raise ValueError("No clean words to mix in adaptive mode")
+        self.clean = {}
+        formats = set()
+        for path in clean_paths:
+            params, amplitude = read_amplitude(path)
+            self.clean[path] = (amplitude, calculate_rms(amplitude))
+            formats.add((params.framerate, params.nchannels))
+        if len(formats) > 1:
+            raise ValueError(f"Clean words mix sample rates and channel counts {sorted(formats)}; "
+                             "harmonize them first")
+        (self.framerate, self.nchannels), = formats
+
+        self.maskers = []
+        for path in open_catalog(REPO_ROOT).match(MASKERS[noise_mode]):
+            masker_params, samples = open_wav(path)
+            if (masker_params.framerate, masker_params.nchannels) == (self.framerate, self.nchannels):
+                self.maskers.append(np.array(samples))
+        longest = max(len(amplitude) for amplitude, _ in self.clean.values())
+        if not any(len(samples) >= longest for samples in self.maskers):
+            raise ValueError(f"No {noise_mode} masker in {MASKERS[noise_mode]} at {self.framerate} Hz with "
+                             f"{self.nchannels} channel(s) is as long as the longest clean word ({longest} samples)")
+
+        self.kernel = MixKernel()
+        self.rng = random.Random(seed)
+
+    def mix(self, clean_path, snr):
+        """Return the int16 mixture of a clean word with a random masker segment at snr dB."""
+        clean_amp, clean_rms = self.clean[clean_path]
+        maskers = [samples for samples in self.maskers if len(samples) >= len(clean_amp)]
+        samples = self.rng.choice(maskers)
+        # whole frames only, so the segment's channels line up with the word's
+        start = self.rng.randint(0, (len(samples) - len(clean_amp)) // self.nchannels) * self.nchannels
+        segment = samples[start:start + len(clean_amp)].astype(np.float64)
+        noise_rms = calculate_rms(segment)
+        return self.kernel.mix(clean_amp, segment, [snr], clean_rms, noise_rms).pcm[0]
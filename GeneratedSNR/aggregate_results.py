@@ -0,0 +1,153 @@
+import argparse
+import csv
+import glob
+import os
+
+import numpy as np
+
+from session_plan import UNKNOWN, VOWEL_CONTRASTS, WORD_PAIRS, resolve
+
+STORE_NAME = 'results_store.npz'
+STRING_COLUMNS = ['participant', 'audio_file', 'noise_mode', 'word', 'pair', 'contrast', 'choice']
+GROUPINGS = [('participant',), ('snr',), ('noise_mode',), ('contrast',), ('pair',), ('noise_mode', 'snr')]
+
+
+def pair_labels(word_pairs=WORD_PAIRS):
+    """Map both words of a pair to one 'word/foil' label, and each label to its vowel contrast."""
+    labels = {}
+    for word, foil in word_pairs.items():
+        labels[word] = labels[foil] = f"{word}/{foil}"
+    contrasts = {f"{word}/{word_pairs[word]}": contrast
+                 for contrast, words in VOWEL_CONTRASTS.items() for word in words}
+    return labels, contrasts
+
+
+PAIR_LABELS, PAIR_CONTRASTS = pair_labels()
+
+
+def read_result_file(path):
+    """Parse one result CSV into a dict of columns; old files without timing columns get NaN reaction times."""
+    participant = os.path.splitext(os.path.basename(path))[0]
+    rows = {name: [] for name in STRING_COLUMNS}
+    snr, correct, reaction = [], [], []
+    with open(path, newline='') as f:
+        for record in csv.DictReader(f):
+            resolved = resolve(record['Audio File'], 'Clear')
+            if resolved is None:
+                continue
+            word, _, noise_mode, word_snr = resolved
+            pair = PAIR_LABELS.get(word, UNKNOWN)
+            rows['participant'].append(participant)
+            rows['audio_file'].append(record['Audio File'])
+            rows['noise_mode'].append(noise_mode)
+            rows['word'].append(word)
+            rows['pair'].append(pair)
+            rows['contrast'].append(PAIR_CONTRASTS.get(pair, UNKNOWN))
+            rows['choice'].append(record['User Choice'])
+            snr.append(np.nan if word_snr is None else word_snr)
+            correct.append(record['Is Correct'] == 'True')
+            reaction.append(float(record.get('Reaction Time (ms)') or 'nan'))
+
+    columns = {name: np.array(values, dtype=str) for name, values in rows.items()}
+    columns['snr'] = np.array(snr, dtype=np.float64)
+    columns['correct'] = np.array(correct, dtype=bool)
+    columns['reaction_ms'] = np.array(reaction, dtype=np.float64)
+    return columns
+
+
+class ResultStore:
+    """All trials of all result files as typed numpy columns, saved to one .npz.
+
+    Each ingested file is remembered with its size and mtime, so ``update``
+    only parses files that are new or have grown since the last run.
+    """
+
+    def __init__(self, path=STORE_NAME):
+        self.path = path
+        self.columns = {}
+        self.sources = {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.columns = {name: data[name] for name in data.files if not name.startswith('source_')}
+                self.sources = {name: (int(size), int(mtime_ns)) for name, size, mtime_ns in
+                                zip(data['source_name'], data['source_size'], data['source_mtime_ns'])}
+
+    def __len__(self):
+        return len(self.columns['correct']) if self.columns else 0
+
+    def update(self, result_files):
+        """Ingest result files that are new or changed; returns how many were read."""
+        changed = []
+        for path in result_files:
+            stat = os.stat(path)
+            name = os.path.splitext(os.path.basename(path))[0]
+            if self.sources.get(name) != (stat.st_size, stat.st_mtime_ns):
+                changed.append((path, name, (stat.st_size, stat.st_mtime_ns)))
+
+        for path, name, key in changed:
+            columns = read_result_file(path)
+            if self.columns:
+                keep = self.columns['participant'] != name
+                self.columns = {column: np.concatenate([values[keep], columns[column]])
+                                for column, values in self.columns.items()}
+            else:
+                self.columns = columns
+            self.sources[name] = key
+        return len(changed)
+
+    def save(self):
+        names = sorted(self.sources)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, **self.columns,
+                 source_name=np.array(names, dtype=str),
+                 source_size=np.array([self.sources[name][0] for name in names], dtype=np.int64),
+                 source_mtime_ns=np.array([self.sources[name][1] for name in names], dtype=np.int64))
+        os.replace(tmp_path, self.path)
+
+    def accuracy_by(self, *keys):
+        """Group trials by the key columns; returns (key values, trials, correct, accuracy, mean reaction ms)."""
+        codes = []
+        uniques = []
+        for key in keys:
+            values, inverse = np.unique(self.columns[key], return_inverse=True)
+            uniques.append(values)
+            codes.append(inverse)
+        group_values, group = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        group = group.ravel()
+
+        trials = np.bincount(group)
+        correct = np.bincount(group, weights=self.columns['correct'])
+        reaction = self.columns['reaction_ms']
+        timed = ~np.isnan(reaction)
+        timed_trials = np.bincount(group[timed], minlength=len(trials))
+        reaction_sum = np.bincount(group[timed], weights=reaction[timed], minlength=len(trials))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_reaction = reaction_sum / timed_trials
+
+        labels = [tuple(uniques[i][code] for i, code in enumerate(row)) for row in group_values]
+        return labels, trials, correct.astype(np.int64), correct / trials, mean_reaction
+
+
+def print_table(store, keys):
+    labels, trials, correct, accuracy, mean_reaction = store.accuracy_by(*keys)
+    print(f"\nAccuracy by {', '.join(keys)}")
+    for label, n, k, acc, rt in zip(labels, trials, correct, accuracy, mean_reaction):
+        name = ' '.join('Clear' if isinstance(v, float) and np.isnan(v) else str(v) for v in label)
+        reaction = f"{rt:8.0f} ms" if not np.isnan(rt) else ''
+        print(f"  {name:40s} {k:5d}/{n:<5d} {acc * 100:6.1f}%  {reaction}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aggregate listening-test accuracy over all result_*.csv files.")
+    parser.add_argument('--results', default='.', help="directory holding the result_*.csv files")
+    parser.add_argument('--store', default=STORE_NAME)
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    ingested = store.update(sorted(glob.glob(os.path.join(args.results, 'result_*.csv'))))
+    if ingested:
+        store.save()
+    print(f"Ingested {ingested} new or changed result files; {len(store)} trials in total")
+    if len(store):
+        for keys in GROUPINGS:
+            print_table(store, keys)
@@ -1,11 +1,49 @@
 import os
-import random
+import sys
 import pygame
-import csv
 from datetime import datetime
 
+# the corpus catalog and stimulus bank live at the repository root, one level above the player
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive_mode import ADAPTIVE_MASKER, AdaptiveMixer, Staircase  # noqa: E402
+from corpus_catalog import open_catalog  # noqa: E402
+from response_logger import ResponseLogger  # noqa: E402
+from session_plan import STIMULUS_EXTENSIONS, STIMULUS_ROLES, compile_session, report  # noqa: E402
+from sound_cache import SoundPreloader  # noqa: E402
+from stimulus_bank import StimulusBank  # noqa: E402
+
+PLAYBACK_DONE = pygame.USEREVENT + 1
+# packed stimulus sets, from `python stimulus_bank.py GeneratedSNR/stimuli.bank Clear PinkNoise SingleTalker
+# --root GeneratedSNR`; used in place of the folders when present
+STIMULUS_BANK = 'stimuli.bank'
+
+
+def play_audio_files(directory, seed=None, adaptive=False, bank=None):
+    # Read the stimuli from a packed bank if one is given, otherwise from the folder
+    if bank is not None and not adaptive:
+        stimuli = StimulusBank(bank)
+    else:
+        stimuli = None
+
+    # Resolve every stimulus to its word pair and fix the trial order and button sides before the first trial
+    catalog = stimuli if stimuli is not None else open_catalog('.', STIMULUS_ROLES, extensions=STIMULUS_EXTENSIONS)
+    plan = compile_session(directory, catalog, seed)
+    report(plan)
+    trials = plan.trials
+
+    # In adaptive mode the directory holds the clean words, which are mixed with a masker in memory at the SNR
+    # the staircase picks; the mixer is opened in the words' own format so the int16 mixture can be played as is
+    staircase = None
+    if adaptive:
+        adaptive_mixer = AdaptiveMixer([trial.path for trial in trials], seed=plan.seed)
+        staircase = Staircase()
+        pygame.mixer.pre_init(adaptive_mixer.framerate, -16, adaptive_mixer.nchannels, allowedchanges=0)
+    elif stimuli is not None and trials:
+        # bank entries are raw int16 PCM, so the mixer has to be opened in their format
+        params, _ = stimuli.get(trials[0].path)
+        pygame.mixer.pre_init(params.framerate, -16, params.nchannels, allowedchanges=0)
 
-def play_audio_files(directory):
     # Initialize pygame
     pygame.init()
     pygame.mixer.init()
@@ -16,17 +54,14 @@ def play_audio_files(directory):
     font = pygame.font.Font(None, 74)
     middle_font = pygame.font.Font(None, 45)
     small_font = pygame.font.Font(None, 35)
-    clock = pygame.time.Clock()
 
     # Load listen icon
     listen_icon = pygame.image.load('icon.png')
     listen_icon = pygame.transform.scale(listen_icon, (100, 100))
 
-    # Get a list of audio files in the directory
-    audio_files = [f for f in os.listdir(directory) if f.endswith('.wav') or f.endswith('.mp3')]
-
-    # Randomize the audio files
-    random.shuffle(audio_files)
+    # Decode the first trials while the start screen is up, and each next trial while the current one plays
+    load = (lambda name: pygame.mixer.Sound(buffer=stimuli.get(name)[1])) if stimuli is not None else None
+    preloader = SoundPreloader([] if adaptive else [trial.path for trial in trials], load=load)
 
     bg_color = (26, 92, 74)
     text_color = (255, 255, 255)
@@ -34,143 +69,143 @@ def play_audio_files(directory):
     highlight_color = (244, 174, 66)
     progress_bar_bg_color = (100, 100, 100)  # Color for the outer box of the progress bar
 
-    # Create CSV file to log results
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_filename = f"result_{timestamp}.csv"
-    csv_filepath = os.path.join(csv_filename)
-
-    with open(csv_filepath, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Audio File', 'User Choice', 'Is Correct'])
+    # Pre-render everything that does not change between trials, so a trial only draws its progress,
+    # index and button labels and pushes just those regions to the display
+    icon_rect = pygame.Rect(350, 150, 100, 100)
+    progress_rect = pygame.Rect(150, 500, 500, 30)
+    index_rect = pygame.Rect(10, 10, 300, 40)
+    button1_rect = pygame.Rect(150, 400, 200, 100)
+    button2_rect = pygame.Rect(450, 400, 200, 100)
+    trial_rects = [icon_rect, progress_rect, index_rect, button1_rect, button2_rect]
 
-    def start_playing():
-        for index, audio_file in enumerate(audio_files):
-            # Load and play the audio file
-            pygame.mixer.music.load(os.path.join(directory, audio_file))
-            pygame.mixer.music.play()
+    listen_screen = pygame.Surface(screen.get_size())
+    listen_screen.fill(bg_color)
+    listen_screen.blit(listen_icon, icon_rect)
+    pygame.draw.rect(listen_screen, progress_bar_bg_color, progress_rect)
 
-            while pygame.mixer.music.get_busy():
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        return
+    choice_screen = pygame.Surface(screen.get_size())
+    choice_screen.fill(bg_color)
+    pygame.draw.rect(choice_screen, button_color, button1_rect)
+    pygame.draw.rect(choice_screen, button_color, button2_rect)
 
-                # Display listen icon
-                screen.fill(bg_color)
-                screen.blit(listen_icon, (350, 150))
+    labels = {}
 
-                # Display progress bar background
-                pygame.draw.rect(screen, progress_bar_bg_color, (150, 500, 500, 30))
+    def label(word):
+        if word not in labels:
+            labels[word] = middle_font.render(word, True, text_color)
+        return labels[word]
 
-                # Display progress bar
-                progress = (index + 1) / len(audio_files)
-                pygame.draw.rect(screen, text_color, (150, 500, 500 * progress, 30))
+    for trial in trials:
+        for word in trial.buttons:
+            label(word)
 
-                # Display current file index
-                file_index_text = small_font.render(f'File {index + 1} of {len(audio_files)}', True, text_color)
-                screen.blit(file_index_text, (10, 10))
+    # Create CSV file to log results
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_filename = f"result_{timestamp}.csv"
+    csv_filepath = os.path.join(csv_filename)
+    logger = ResponseLogger(csv_filepath, seed=plan.seed)
 
+    def start_playing():
+        for index, trial in enumerate(trials):
+            requested = logger.now()
+            if staircase is not None:
+                snr = staircase.snr
+                sound = pygame.mixer.Sound(buffer=adaptive_mixer.mix(trial.path, snr))
+                audio_file = f"{ADAPTIVE_MASKER}_SNR_{snr:g}_dB_{trial.audio_file}"
+            else:
+                sound = preloader.get(index)
+                audio_file = trial.audio_file
+
+            # Display listen icon, progress bar and current file index
+            screen.blit(listen_screen, (0, 0))
+            progress = (index + 1) / len(trials)
+            pygame.draw.rect(screen, text_color, (150, 500, 500 * progress, 30))
+            file_index_text = small_font.render(f'File {index + 1} of {len(trials)}', True, text_color)
+            screen.blit(file_index_text, index_rect)
+            if index == 0:
                 pygame.display.flip()
-                clock.tick(30)
-
-            # Display choice buttons
-            user_choice = get_user_choice(audio_file)  # Get user's choice
-            is_correct = user_choice in audio_file  # Check if the user's choice is correct
+            else:
+                pygame.display.update(trial_rects)
 
-            # Log the result to CSV
-            with open(csv_filepath, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([audio_file, user_choice, is_correct])
-                print(f"Logged result to {csv_filepath}")
+            # Play the audio file from its preloaded buffer and sleep until its channel reports the end
+            channel = pygame.mixer.find_channel(True)
+            channel.set_endevent(PLAYBACK_DONE)
+            channel.play(sound)
+            onset = logger.now()
 
-        # Quit pygame after all files have been played
-        pygame.quit()
-
-    def get_user_choice(audio_file):
-        word_pair = list(get_word_pair(audio_file))
-        random.shuffle(word_pair)  # Add this line to shuffle the word pair
-        choice = None
-
-        while choice is None:
-            screen.fill(bg_color)
-
-            # Draw the buttons
-            button1_rect = pygame.Rect(150, 400, 200, 100)
-            button2_rect = pygame.Rect(450, 400, 200, 100)
-            pygame.draw.rect(screen, button_color, button1_rect)
-            pygame.draw.rect(screen, button_color, button2_rect)
-
-            button1_text = middle_font.render(word_pair[0], True, text_color)
-            button2_text = middle_font.render(word_pair[1], True, text_color)
-            # screen.blit(button1_text, button1_rect.move(20, 30))
-            # screen.blit(button2_text, button2_rect.move(20, 30))
-
-            text1_rect = button1_text.get_rect(center=button1_rect.center)
-            screen.blit(button1_text, text1_rect)
-            text2_rect = button2_text.get_rect(center=button2_rect.center)
-            screen.blit(button2_text, text2_rect)
-
-            pygame.display.flip()
-
-            for event in pygame.event.get():
+            while True:
+                event = pygame.event.wait()
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return None
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if button1_rect.collidepoint(event.pos):
-                        choice = word_pair[0]
-                    elif button2_rect.collidepoint(event.pos):
-                        choice = word_pair[1]
-
-        return choice
-
-    def get_word_pair(audio_file):
-        word_pairs = {
-            'rich': 'reach', 'itch': 'each', 'sin': 'scene', 'list': 'least',
-            'chip': 'cheap', 'filled': 'field', 'grin': 'green', 'bet': 'bat',
-            'pet': 'pat', 'met': 'mat', 'set': 'sat', 'ten': 'tan',
-            'men': 'man', 'Ken': 'can', 'cut': 'cot', 'but': 'bot',
-            'hut': 'hot', 'nut': 'not', 'sub': 'sob', 'fund': 'fond',
-            'pup': 'pop', 'look': 'Luke', 'pull': 'pool', 'full': 'fool',
-            'should': 'shooed', 'bull': 'Boole', 'could': 'cooed', 'would': 'wooed'
-        }
-        # Extract word from filename
-        word = audio_file.split('_')[-1].split('.')[0]
-
-        if word in word_pairs:
-            return word, word_pairs[word]
-        else:
-            for key, value in word_pairs.items():
-                if value == word:
-                    return value, key
-
-        return word, "Unknown"
-
-    # Main loop to wait for the start button press
-    running = True
-    while running:
-        screen.fill(bg_color)
+                    return
+                if event.type == PLAYBACK_DONE:
+                    offset = logger.now()
+                    break
 
-        # Draw the start button
+            # Display choice buttons
+            user_choice, shown, click = get_user_choice(trial)  # Get user's choice
+            if user_choice is None:
+                return
+            is_correct = user_choice == trial.target  # Check if the user's choice is correct
+
+            # Log the result, with the trial's timestamps, to CSV
+            logger.log(audio_file, user_choice, is_correct, requested, onset, offset, shown, click)
+
+            if staircase is not None:
+                staircase.update(is_correct)
+                if staircase.done:
+                    break
+
+        if staircase is not None:
+            print(f"Adaptive {ADAPTIVE_MASKER} threshold: {staircase.threshold():.1f} dB SNR "
+                  f"after {len(staircase.reversals)} reversals")
+
+    def get_user_choice(trial):
+        word_pair = trial.buttons
+
+        # Draw the buttons once, then sleep until the participant clicks one
+        screen.blit(choice_screen, (0, 0))
+        button1_text = label(word_pair[0])
+        button2_text = label(word_pair[1])
+        screen.blit(button1_text, button1_text.get_rect(center=button1_rect.center))
+        screen.blit(button2_text, button2_text.get_rect(center=button2_rect.center))
+        pygame.display.update(trial_rects)
+        shown = logger.now()
+
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                return None, shown, None
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                click = logger.now()
+                if button1_rect.collidepoint(event.pos):
+                    return word_pair[0], shown, click
+                elif button2_rect.collidepoint(event.pos):
+                    return word_pair[1], shown, click
+
+    # Draw the start button once, then wait for it to be pressed; however the session ends, buffered
+    # results are written out and the loader thread is stopped
+    try:
+        screen.fill(bg_color)
         start_button_rect = pygame.Rect(300, 250, 200, 100)
         pygame.draw.rect(screen, highlight_color, start_button_rect)
         start_text = font.render('Start', True, bg_color)
         text_rect = start_text.get_rect(center=start_button_rect.center)
         screen.blit(start_text, text_rect)
-
         pygame.display.flip()
 
-        for event in pygame.event.get():
+        running = True
+        while running:
+            event = pygame.event.wait()
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if start_button_rect.collidepoint(event.pos):
                     start_playing()
                     running = False
-
-        clock.tick(30)
-
-    pygame.quit()
+    finally:
+        logger.close()
+        preloader.close()
+        pygame.quit()
 
 def select_mode():
     selected_mode = mode_var.get()
@@ -187,7 +222,6 @@ def main():
     pygame.display.set_caption("Select Mode")
     font = pygame.font.Font(None, 74)
     small_font = pygame.font.Font(None, 35)
-    clock = pygame.time.Clock()
 
     bg_color = (26, 92, 74)
     text_color = (255, 255, 255)
@@ -197,58 +231,68 @@ def main():
     global mode_var
     mode_var = 'Clear'
 
-    running = True
-    while running:
-        screen.fill(bg_color)
+    screen.fill(bg_color)
 
-        # Draw the buttons for mode selection
-        env_button_rect = pygame.Rect(150, 150, 200, 100)
-        single_button_rect = pygame.Rect(450, 150, 200, 100)
-        pink_button_rect = pygame.Rect(300, 300, 200, 100)
+    # Draw the buttons for mode selection once, then wait for a click
+    env_button_rect = pygame.Rect(150, 150, 200, 100)
+    single_button_rect = pygame.Rect(450, 150, 200, 100)
+    pink_button_rect = pygame.Rect(300, 300, 200, 100)
+    adaptive_button_rect = pygame.Rect(300, 450, 200, 100)
 
-        pygame.draw.rect(screen, highlight_color, env_button_rect)
-        pygame.draw.rect(screen, highlight_color, single_button_rect)
-        pygame.draw.rect(screen, highlight_color, pink_button_rect)
+    pygame.draw.rect(screen, highlight_color, env_button_rect)
+    pygame.draw.rect(screen, highlight_color, single_button_rect)
+    pygame.draw.rect(screen, highlight_color, pink_button_rect)
+    pygame.draw.rect(screen, highlight_color, adaptive_button_rect)
 
-        env_text = small_font.render('Clear', True, bg_color)
-        single_text = small_font.render('Single Talker', True, bg_color)
-        pink_text = small_font.render('Pink Noise', True, bg_color)
+    env_text = small_font.render('Clear', True, bg_color)
+    single_text = small_font.render('Single Talker', True, bg_color)
+    pink_text = small_font.render('Pink Noise', True, bg_color)
+    adaptive_text = small_font.render('Adaptive', True, bg_color)
 
-        env_text_rect = env_text.get_rect(center=env_button_rect.center)
-        screen.blit(env_text, env_text_rect)
+    env_text_rect = env_text.get_rect(center=env_button_rect.center)
+    screen.blit(env_text, env_text_rect)
 
-        single_text_rect = single_text.get_rect(center=single_button_rect.center)
-        screen.blit(single_text, single_text_rect)
+    single_text_rect = single_text.get_rect(center=single_button_rect.center)
+    screen.blit(single_text, single_text_rect)
 
-        pink_text_rect = pink_text.get_rect(center=pink_button_rect.center)
-        screen.blit(pink_text, pink_text_rect)
+    pink_text_rect = pink_text.get_rect(center=pink_button_rect.center)
+    screen.blit(pink_text, pink_text_rect)
 
-        pygame.display.flip()
+    adaptive_text_rect = adaptive_text.get_rect(center=adaptive_button_rect.center)
+    screen.blit(adaptive_text, adaptive_text_rect)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if env_button_rect.collidepoint(event.pos):
-                    mode_var = 'Clear'
-                    running = False
-                elif single_button_rect.collidepoint(event.pos):
-                    mode_var = 'SingleTalker'
-                    running = False
-                elif pink_button_rect.collidepoint(event.pos):
-                    mode_var = 'PinkNoise'
-                    running = False
+    pygame.display.flip()
 
-        clock.tick(30)
+    running = True
+    while running:
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            running = False
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if env_button_rect.collidepoint(event.pos):
+                mode_var = 'Clear'
+                running = False
+            elif single_button_rect.collidepoint(event.pos):
+                mode_var = 'SingleTalker'
+                running = False
+            elif pink_button_rect.collidepoint(event.pos):
+                mode_var = 'PinkNoise'
+                running = False
+            elif adaptive_button_rect.collidepoint(event.pos):
+                mode_var = 'Adaptive'
+                running = False
 
     pygame.quit()
 
+    bank = STIMULUS_BANK if os.path.exists(STIMULUS_BANK) else None
     if mode_var == 'Clear':
-        play_audio_files('Clear')
+        play_audio_files('Clear', bank=bank)
     elif mode_var == 'SingleTalker':
-        play_audio_files('SingleTalker')
+        play_audio_files('SingleTalker', bank=bank)
     elif mode_var == 'PinkNoise':
-        play_audio_files('PinkNoise')
+        play_audio_files('PinkNoise', bank=bank)
+    elif mode_var == 'Adaptive':
+        play_audio_files('Clear', adaptive=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import csv
+import os
+import time
+
+COLUMNS = ['Audio File', 'User Choice', 'Is Correct', 'Requested (s)', 'Onset (s)', 'Offset (s)', 'Buttons Shown (s)',
+           'Click (s)', 'Reaction Time (ms)', 'Onset Delay (ms)', 'Session Seed']
+
+
+class ResponseLogger:
+    """Write one CSV row per trial through a single open file.
+
+    Times come from ``now()``, a monotonic high-resolution clock in seconds
+    since the logger was created. Rows are buffered and only written, flushed
+    and fsynced every ``flush_every`` trials and on close, right after a
+    click, so no disk I/O lands between a stimulus request and its onset.
+    Every row carries the session seed, so the trial order and button
+    sides can be rebuilt from the results alone.
+    """
+
+    def __init__(self, path, flush_every=10, seed=None):
+        self.path = path
+        self.flush_every = flush_every
+        self.seed = seed
+        self._origin = time.perf_counter_ns()
+        self._rows = []
+        self._file = open(path, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+        self.flush()
+
+    def now(self):
+        return (time.perf_counter_ns() - self._origin) / 1e9
+
+    def log(self, audio_file, user_choice, is_correct, requested, onset, offset, shown, click):
+        """Buffer a trial; reaction time is click minus button display, onset delay is onset minus request."""
+        self._rows.append([audio_file, user_choice, is_correct, f"{requested:.6f}", f"{onset:.6f}", f"{offset:.6f}",
+                           f"{shown:.6f}", f"{click:.6f}", f"{(click - shown) * 1e3:.3f}",
+                           f"{(onset - requested) * 1e3:.3f}", '' if self.seed is None else self.seed])
+        if len(self._rows) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._writer.writerows(self._rows)
+        self._rows = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+            print(f"Logged results to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
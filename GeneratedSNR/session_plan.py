@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+from collections import namedtuple
+
+# the stimulus name pattern is shared with the root modules, one level above this folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stimulus_names import STIMULUS_NAME  # noqa: E402
+
+WORD_PAIRS = {
+    'rich': 'reach', 'itch': 'each', 'sin': 'scene', 'list': 'least',
+    'chip': 'cheap', 'filled': 'field', 'grin': 'green', 'bet': 'bat',
+    'pet': 'pat', 'met': 'mat', 'set': 'sat', 'ten': 'tan',
+    'men': 'man', 'Ken': 'can', 'cut': 'cot', 'but': 'bot',
+    'hut': 'hot', 'nut': 'not', 'sub': 'sob', 'fund': 'fond',
+    'pup': 'pop', 'look': 'Luke', 'pull': 'pool', 'full': 'fool',
+    'should': 'shooed', 'bull': 'Boole', 'could': 'cooed', 'would': 'wooed'
+}
+VOWEL_CONTRASTS = {
+    'ɪ/iː': ['rich', 'itch', 'sin', 'list', 'chip', 'filled', 'grin'],
+    'ɛ/æ': ['bet', 'pet', 'met', 'set', 'ten', 'men', 'Ken'],
+    'ʌ/ɒ': ['cut', 'but', 'hut', 'nut', 'sub', 'fund', 'pup'],
+    'ʊ/uː': ['look', 'pull', 'full', 'should', 'bull', 'could', 'would'],
+}
+UNKNOWN = 'Unknown'
+# catalog roles of the stimulus directories next to the player, one per noise mode
+STIMULUS_ROLES = {'Clear': 'Clear', 'PinkNoise': 'PinkNoise', 'SingleTalker': 'SingleTalker'}
+# stimuli may be WAV or MP3, as STIMULUS_NAME accepts
+STIMULUS_EXTENSIONS = ('.wav', '.mp3')
+
+# buttons is the (left, right) order of target and foil on the choice screen
+Trial = namedtuple('Trial', ['path', 'audio_file', 'target', 'foil', 'noise_mode', 'snr', 'buttons'])
+SessionPlan = namedtuple('SessionPlan', ['seed', 'trials', 'unknown', 'skipped'])
+
+
+def pair_index(word_pairs=WORD_PAIRS):
+    """Map every word to its foil, in both directions."""
+    index = dict(word_pairs)
+    index.update((foil, word) for word, foil in word_pairs.items())
+    return index
+
+
+PAIR_INDEX = pair_index()
+
+
+def resolve(audio_file, default_mode):
+    """Return (target, foil, noise_mode, snr) for a stimulus file name, or None if it is not one."""
+    match = STIMULUS_NAME.match(audio_file)
+    if match is None:
+        return None
+    target = match.group('word')
+    snr = float(match.group('snr')) if match.group('snr') is not None else None
+    return target, PAIR_INDEX.get(target, UNKNOWN), match.group('mode') or default_mode, snr
+
+
+def compile_session(directory, catalog, seed=None):
+    """Resolve every stimulus the catalog lists in directory and fix its trial order and button sides from seed."""
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    rng = random.Random(seed)
+    default_mode = os.path.basename(os.path.normpath(directory))
+
+    trials = []
+    skipped = []
+    for path in catalog.listing(directory):
+        name = os.path.basename(path)
+        resolved = resolve(name, default_mode)
+        if resolved is None:
+            skipped.append(name)
+            continue
+        target, foil, noise_mode, snr = resolved
+        trials.append(Trial(path, name, target, foil, noise_mode, snr, (target, foil)))
+
+    rng.shuffle(trials)
+    trials = [trial._replace(buttons=trial.buttons[::-1]) if rng.random() < 0.5 else trial for trial in trials]
+    unknown = [trial.audio_file for trial in trials if trial.foil == UNKNOWN]
+    return SessionPlan(seed, trials, unknown, skipped)
+
+
+def report(plan):
+    print(f"Session of {len(plan.trials)} trials with seed {plan.seed}")
+    for audio_file in plan.unknown:
+        print(f"No word pair for {audio_file}; its foil will show as {UNKNOWN}")
+    for audio_file in plan.skipped:
+        print(f"Skipped {audio_file}: not a stimulus file name")
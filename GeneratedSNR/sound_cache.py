@@ -0,0 +1,68 @@
+import threading
+
+import pygame
+
+
+class SoundPreloader:
+    """Decode trial files into pygame Sounds ahead of playback on a background thread.
+
+    At most ``lookahead`` trials are held in memory: the one being played and
+    the ones after it. Asking for a trial frees every earlier one and lets the
+    loader move on, so stimulus onset never waits on the disk unless the
+    loader has fallen behind. ``load`` turns a path into a Sound and
+    defaults to decoding the file.
+    """
+
+    def __init__(self, paths, lookahead=2, load=None):
+        self.paths = list(paths)
+        self.lookahead = lookahead
+        self.load = load if load is not None else pygame.mixer.Sound
+        self._sounds = {}
+        self._current = 0
+        self._next = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._next >= len(self.paths)
+                                            or self._next >= self._current + self.lookahead):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                index = self._next
+                self._next += 1
+
+            # any failure is handed to get() to raise, so the player never waits on a dead loader
+            try:
+                sound = self.load(self.paths[index])
+            except Exception as e:
+                sound = e
+
+            with self._cond:
+                self._sounds[index] = sound
+                self._cond.notify_all()
+
+    def get(self, index):
+        """Return the Sound for trial index, waiting only if it is not decoded yet."""
+        with self._cond:
+            self._current = index
+            for done in [i for i in self._sounds if i < index]:
+                del self._sounds[done]
+            self._cond.notify_all()
+            while index not in self._sounds:
+                self._cond.wait()
+            sound = self._sounds[index]
+        if isinstance(sound, Exception):
+            raise sound
+        return sound
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._sounds.clear()
+            self._cond.notify_all()
+        self._thread.join()
@@ -1,14 +1,19 @@
 import os
-import glob
+import sys
 
-# Function to recursively find all wav files in a directory
+# the corpus catalog lives at the repository root, one level above this folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus_catalog import open_catalog  # noqa: E402
+
+# the whole tree under the starting directory is one role; its own cache file keeps it apart from the corpus catalog
+WORD_ROLES = {'.': 'word'}
+WORD_CATALOG_NAME = 'word_catalog.json'
+
+
+# Function to find all wav files under directory, through the cached catalog
 def find_wav_files(directory):
-    wav_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".wav"):
-                wav_files.append(os.path.join(root, file))
-    return wav_files
+    return open_catalog(directory, WORD_ROLES, WORD_CATALOG_NAME).paths()
 
 # Function to rename wav files
 def rename_wav_files(directory):
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+
+from corpus_catalog import open_catalog
+from speech_level import frame_energies, frame_length, level_from_energies
+from wav_reader import open_wav
+
+INDEX_NAME = 'acoustic_index.npz'
+INDEX_DIRS = ['Words', 'Sentences', 'Noise', 'Environment']
+STATS_BLOCK_SIZE = 1024 * 1024
+
+COLUMNS = {
+    'path': np.str_,
+    'duration': np.float64,
+    'framerate': np.int32,
+    'sampwidth': np.int8,
+    'nchannels': np.int8,
+    'nframes': np.int64,
+    'rms': np.float64,
+    'active_level': np.float64,
+    'peak': np.int32,
+    'mtime_ns': np.int64,
+    'size': np.int64,
+}
+
+
+def measure(path):
+    """Measure one WAV file, reading the mapped samples in blocks."""
+    params, samples = open_wav(path)
+    length = frame_length(params.framerate, params.nchannels)
+    # whole frames per block, so the activity frames line up across blocks
+    block_size = max(1, STATS_BLOCK_SIZE // length) * length
+    square_sum = 0.0
+    peak = 0
+    energies = []
+    for block_start in range(0, len(samples), block_size):
+        block = samples[block_start:block_start + block_size].astype(np.float64)
+        square_sum += np.dot(block, block)
+        peak = max(peak, int(np.abs(block).max()))
+        energies.append(frame_energies(block, length))
+    rms = np.sqrt(square_sum / len(samples)) if len(samples) else 0.0
+    active_level = level_from_energies(np.concatenate(energies), length) if energies else None
+    return {
+        'duration': params.nframes / params.framerate,
+        'framerate': params.framerate,
+        'sampwidth': params.sampwidth,
+        'nchannels': params.nchannels,
+        'nframes': params.nframes,
+        'rms': rms,
+        'active_level': rms if active_level is None else active_level,
+        'peak': peak,
+    }
+
+
+class AcousticIndex:
+    """Per-file duration, format, RMS, active speech level and peak for every WAV under a corpus root.
+
+    The index is stored column by column in ``acoustic_index.npz`` at the
+    root. ``update`` only re-measures files whose size or mtime changed, so
+    lookups and selections never have to decode audio.
+    """
+
+    def __init__(self, root='.'):
+        self.root = root
+        self.path = os.path.join(root, INDEX_NAME)
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                # an index saved before a column was added is measured again from scratch
+                if all(name in data for name in COLUMNS):
+                    self.columns = {name: data[name] for name in COLUMNS}
+        self._rows = {}
+        self._reindex()
+
+    def __len__(self):
+        return len(self.columns['path'])
+
+    def __contains__(self, path):
+        return self._key(path) in self._rows
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _reindex(self):
+        self._rows = {path: row for row, path in enumerate(self.columns['path'].tolist())}
+
+    def scan(self, dirs=INDEX_DIRS):
+        """List (key, stat) for every WAV file under the index directories."""
+        entries = []
+        for path in open_catalog(self.root).paths():
+            key = self._key(path)
+            if any(key == directory or key.startswith(directory + '/') for directory in dirs):
+                entries.append((key, os.stat(path)))
+        return sorted(entries, key=lambda entry: entry[0])
+
+    def update(self, dirs=INDEX_DIRS):
+        """Bring the index up to date with the files on disk and return how many were measured."""
+        records = []
+        measured = 0
+        for key, stat in self.scan(dirs):
+            row = self._rows.get(key)
+            if (row is not None and self.columns['size'][row] == stat.st_size
+                    and self.columns['mtime_ns'][row] == stat.st_mtime_ns):
+                records.append({name: self.columns[name][row] for name in COLUMNS})
+                continue
+
+            try:
+                stats = measure(os.path.join(self.root, key))
+            except ValueError as e:
+                # not a 16-bit PCM WAV, e.g. a Git LFS pointer that was never pulled
+                print(f"Skipping {key}: {e}")
+                continue
+            stats.update(path=key, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            records.append(stats)
+            measured += 1
+
+        self.columns = {name: np.array([record[name] for record in records], dtype=dtype)
+                        for name, dtype in COLUMNS.items()}
+        self._reindex()
+        return measured
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **self.columns)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, path):
+        """Return the stored row of a file as a dict, or None if it is not indexed."""
+        row = self._rows.get(self._key(path))
+        if row is None:
+            return None
+        return {name: self.columns[name][row].item() for name in COLUMNS}
+
+    def rms(self, path):
+        row = self._rows.get(self._key(path))
+        return None if row is None else float(self.columns['rms'][row])
+
+    def level(self, path, level='rms'):
+        """Stored clean level of a file for the mixers: 'rms' over the whole file or the 'active' speech level."""
+        row = self._rows.get(self._key(path))
+        column = 'active_level' if level == 'active' else 'rms'
+        return None if row is None else float(self.columns[column][row])
+
+    def length(self, path):
+        """Number of samples in the file, as the mixers count them (frames x channels)."""
+        row = self._rows.get(self._key(path))
+        if row is None:
+            return None
+        return int(self.columns['nframes'][row]) * int(self.columns['nchannels'][row])
+
+    def select(self, prefix='', min_duration=None, max_duration=None):
+        """Return indexed paths under a prefix whose duration falls in the given range."""
+        paths = self.columns['path']
+        duration = self.columns['duration']
+        mask = np.char.startswith(paths, prefix) if prefix else np.ones(len(paths), dtype=bool)
+        if min_duration is not None:
+            mask &= duration >= min_duration
+        if max_duration is not None:
+            mask &= duration <= max_duration
+        return [os.path.normpath(os.path.join(self.root, path)) for path in paths[mask].tolist()]
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from corpus_catalog import open_catalog
+from create_mixed_audio_file import calculate_amplitude, calculate_rms, process_waveforms
+from create_mixed_audio_file_keep_length import process_audio, process_audio_streaming
+from generate_corpus import build_jobs, generate
+from mixing_engine import MixKernel, mix_snr_grid
+from noise_bank import NoiseBank
+from wav_reader import read_amplitude
+
+
+def write_wav(path, amplitude, framerate):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setparams((1, 2, framerate, len(amplitude), 'NONE', 'not compressed'))
+        wav_file.writeframes(amplitude.astype(np.int16))
+
+
+def build_synthetic_corpus(root, n_words=20, word_duration=0.6, masker_duration=60.0, n_sentences=10,
+                           sentence_duration=3.0, n_speakers=2, framerate=44100, seed=0):
+    """Write a corpus with the same layout as the real one, filled with int16 noise."""
+    rng = np.random.default_rng(seed)
+
+    def noise(duration, level):
+        return np.clip(rng.normal(0, level, int(duration * framerate)), -32768, 32767)
+
+    for s in range(n_speakers):
+        speaker = f"S{s + 1}"
+        for w in range(n_words):
+            write_wav(os.path.join(root, 'Words', 'Target', speaker, f"w{w:03d}.wav"), noise(word_duration, 4000),
+                      framerate)
+        for n in range(n_sentences):
+            write_wav(os.path.join(root, 'Sentences', speaker, f"s{n:03d}.wav"), noise(sentence_duration, 3000),
+                      framerate)
+    write_wav(os.path.join(root, 'Noise', 'Concat_p1_Nz.wav'), noise(masker_duration, 2000), framerate)
+    write_wav(os.path.join(root, 'Environment', 'rain.wav'), noise(masker_duration, 2000), framerate)
+
+
+def time_stage(func, repeat, items=1, samples=0):
+    """Run func repeat times and summarise the wall times."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    result = {'min_s': min(times), 'median_s': median, 'repeat': repeat, 'items_per_s': items / median}
+    if samples:
+        result['samples_per_s'] = samples / median
+    return result
+
+
+def run_benchmarks(root, snr_list, repeat=5, workers=None):
+    clean_file = os.path.join(root, 'Words', 'Target', 'S1', 'w000.wav')
+    masker_file = os.path.join(root, 'Noise', 'Concat_p1_Nz.wav')
+    sentence_file = os.path.join(root, 'Sentences', 'S1', 's000.wav')
+    out_dir = os.path.join(root, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+
+    _, clean_amp = read_amplitude(clean_file)
+    _, masker_amp = read_amplitude(masker_file)
+    segment = masker_amp[:len(clean_amp)]
+    n_clean = len(clean_amp)
+    grid_samples = n_clean * len(snr_list)
+
+    def decode_wave():
+        with wave.open(masker_file) as wav_file:
+            calculate_amplitude(wav_file)
+
+    kernel64 = MixKernel(np.float64)
+    kernel32 = MixKernel(np.float32)
+    bank = NoiseBank()
+    results = {
+        'decode_wave_masker': time_stage(decode_wave, repeat, samples=len(masker_amp)),
+        'decode_memmap_masker': time_stage(lambda: read_amplitude(masker_file), repeat, samples=len(masker_amp)),
+        'rms_masker': time_stage(lambda: calculate_rms(masker_amp), repeat, samples=len(masker_amp)),
+        'mix_grid_alloc': time_stage(lambda: mix_snr_grid(clean_amp, segment, snr_list), repeat,
+                                     samples=grid_samples),
+        'mix_grid_kernel64': time_stage(lambda: kernel64.mix(clean_amp, segment, snr_list), repeat,
+                                        samples=grid_samples),
+        'mix_grid_kernel32': time_stage(lambda: kernel32.mix(clean_amp, segment, snr_list), repeat,
+                                        samples=grid_samples),
+        'process_waveforms': time_stage(
+            lambda: process_waveforms(clean_file, masker_file, 'PinkNoise', snr_list, bank, out_dir), repeat,
+            items=len(snr_list)),
+        'process_audio': time_stage(
+            lambda: process_audio(clean_file, sentence_file, snr_list, 'SingleTalker', bank, out_dir), repeat,
+            items=len(snr_list)),
+        'process_audio_streaming': time_stage(
+            lambda: process_audio_streaming(clean_file, sentence_file, snr_list, 'SingleTalker', bank, out_dir),
+            repeat, items=len(snr_list)),
+    }
+
+    # end to end over the whole synthetic corpus, run from the corpus root like the real scripts
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        speakers = open_catalog().speakers('target')
+        jobs = build_jobs(speakers, ['PinkNoise', 'SingleTalker'], snr_list, 'generated')
+        outputs = len(jobs) * len(snr_list)
+        results['generate_corpus'] = time_stage(lambda: generate(jobs, workers), 1, items=outputs)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def git_commit():
+    try:
+        # ask the checkout this script lives in, wherever it is run from
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, current_path, threshold=0.10):
+    """Print per-stage speed ratios and return the stages that slowed down by more than threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    for stage in sorted(set(baseline) & set(current)):
+        ratio = current[stage]['median_s'] / baseline[stage]['median_s']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(stage)
+        print(f"{stage:28s} {baseline[stage]['median_s'] * 1e3:10.2f} ms -> "
+              f"{current[stage]['median_s'] * 1e3:10.2f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the mixing pipeline on a synthetic corpus.")
+    parser.add_argument('--words', type=int, default=20, help="clean words per speaker")
+    parser.add_argument('--speakers', type=int, default=2)
+    parser.add_argument('--word-duration', type=float, default=0.6)
+    parser.add_argument('--masker-duration', type=float, default=60.0)
+    parser.add_argument('--snr-count', type=int, default=26, help="size of the SNR grid, starting at -15 dB")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    config = {
+        'words': args.words, 'speakers': args.speakers, 'word_duration': args.word_duration,
+        'masker_duration': args.masker_duration, 'snr_count': args.snr_count, 'repeat': args.repeat,
+        'workers': args.workers,
+    }
+    snr_list = list(range(-15, -15 + args.snr_count))
+    root = tempfile.mkdtemp(prefix='mixing_bench_')
+    try:
+        random.seed(0)
+        build_synthetic_corpus(root, args.words, args.word_duration, args.masker_duration,
+                               n_speakers=args.speakers)
+        results = run_benchmarks(root, snr_list, args.repeat, args.workers)
+    finally:
+        shutil.rmtree(root)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    for stage, result in results.items():
+        print(f"{stage:28s} {result['median_s'] * 1e3:10.2f} ms  {result['items_per_s']:10.1f} items/s")
+    print(f"Saved results to {args.output}")
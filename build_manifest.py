@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = 'build_manifest.json'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Record what every generated output was built from, so unchanged outputs can be skipped.
+
+    Each output maps to a record of input hashes, segment offset, SNR and
+    generator parameters. Input hashes are cached against the file's size
+    and mtime, so an incremental run only re-hashes files that changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.outputs = {}
+        self.digests = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.outputs = data.get('outputs', {})
+            self.digests = data.get('digests', {})
+
+    def digest(self, path):
+        """Return the content hash of an input file, re-hashing only if it changed."""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.digests.get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha1']
+
+        sha1 = hash_file(path)
+        self.digests[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1}
+        return sha1
+
+    def is_up_to_date(self, output_path, record):
+        return os.path.exists(output_path) and self.outputs.get(output_path) == record
+
+    def update(self, output_path, record):
+        self.outputs[output_path] = record
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never leaves it half-written."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'outputs': self.outputs, 'digests': self.digests}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
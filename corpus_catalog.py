@@ -0,0 +1,134 @@
+import fnmatch
+import json
+import os
+from collections import namedtuple
+
+CATALOG_NAME = 'corpus_catalog.json'
+CATALOG_VERSION = 1
+# file name extensions a catalog lists unless it is given others
+AUDIO_EXTENSIONS = ('.wav',)
+
+# directory under the root -> role of the WAV files in it; a first subdirectory level is the speaker
+CORPUS_ROLES = {
+    'Words/Target': 'target',
+    'Words/Evaluation': 'evaluation',
+    'Sentences': 'sentence',
+    'Noise': 'noise',
+    'Environment': 'environment',
+}
+
+# speaker is None for files directly in a role directory; word is the file name without its extension
+Entry = namedtuple('Entry', ['path', 'role', 'speaker', 'word'])
+
+
+class CorpusCatalog:
+    """Every audio file under the role directories of a corpus, classified by role, speaker and word.
+
+    Directory listings are cached in ``corpus_catalog.json`` at the root (or
+    another file name, for a catalog with other roles) together with each
+    directory's mtime. A role directory of ``.`` catalogues the whole root. ``update`` stats the known
+    directories and only lists again the ones whose mtime changed, which
+    also picks up added or removed subdirectories. Only files with one of
+    ``extensions`` are listed, WAV alone by default, so Unity ``.meta``
+    sidecars and other files never are.
+    """
+
+    def __init__(self, root='.', roles=CORPUS_ROLES, name=CATALOG_NAME, extensions=AUDIO_EXTENSIONS):
+        self.root = root
+        self.roles = dict(roles)
+        self.extensions = sorted(extensions)
+        self.path = os.path.join(root, name)
+        self.dirs = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if (data.get('version') == CATALOG_VERSION and data.get('roles') == self.roles
+                    and data.get('extensions', list(AUDIO_EXTENSIONS)) == self.extensions):
+                self.dirs = data['dirs']
+        self.entries = []
+        self._index()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self):
+        """Bring the cached listings up to date and return how many directories were listed again."""
+        dirs = {}
+        listed = 0
+        pending = sorted(self.roles)
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = os.stat(os.path.join(self.root, directory)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            cached = self.dirs.get(directory)
+            if cached is None or cached['mtime_ns'] != mtime_ns:
+                cached = self._list(directory, mtime_ns)
+                listed += 1
+            dirs[directory] = cached
+            pending.extend(f"{directory}/{name}" for name in cached['subdirs'])
+
+        changed = listed or dirs.keys() != self.dirs.keys()
+        self.dirs = dirs
+        if changed:
+            self._index()
+        return listed
+
+    def _list(self, directory, mtime_ns):
+        files = []
+        subdirs = []
+        with os.scandir(os.path.join(self.root, directory)) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif os.path.splitext(entry.name)[1] in self.extensions:
+                    files.append(entry.name)
+        return {'mtime_ns': mtime_ns, 'files': sorted(files), 'subdirs': sorted(subdirs)}
+
+    def _index(self):
+        entries = []
+        for directory, listing in self.dirs.items():
+            role_dir = max((d for d in self.roles if directory == d or directory.startswith(d + '/')), key=len)
+            below = directory[len(role_dir) + 1:]
+            speaker = below.split('/')[0] if below else None
+            for name in listing['files']:
+                path = os.path.normpath(os.path.join(self.root, directory, name))
+                entries.append(Entry(path, self.roles[role_dir], speaker, os.path.splitext(name)[0]))
+        self.entries = sorted(entries)
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CATALOG_VERSION, 'roles': self.roles, 'extensions': self.extensions,
+                       'dirs': self.dirs}, f)
+        os.replace(tmp_path, self.path)
+
+    def files(self, role=None, speaker=None):
+        """Entries of one role and/or speaker, sorted by path."""
+        return [entry for entry in self.entries
+                if (role is None or entry.role == role) and (speaker is None or entry.speaker == speaker)]
+
+    def paths(self, role=None, speaker=None):
+        return [entry.path for entry in self.files(role, speaker)]
+
+    def speakers(self, role):
+        return sorted({entry.speaker for entry in self.files(role) if entry.speaker is not None})
+
+    def listing(self, directory):
+        """Paths of the catalogued files directly in directory, sorted."""
+        directory = os.path.normpath(directory)
+        return [entry.path for entry in self.entries if os.path.dirname(entry.path) == directory]
+
+    def match(self, pattern):
+        """Paths matching a glob pattern, compared with fnmatch against the catalog instead of the disk."""
+        pattern = os.path.normpath(pattern)
+        return [entry.path for entry in self.entries if fnmatch.fnmatchcase(entry.path, pattern)]
+
+
+def open_catalog(root='.', roles=CORPUS_ROLES, name=CATALOG_NAME, extensions=AUDIO_EXTENSIONS):
+    """Load the catalog of root, refresh it and save it if any directory had to be listed again."""
+    catalog = CorpusCatalog(root, roles, name, extensions)
+    if catalog.update() or not os.path.exists(catalog.path):
+        catalog.save()
+    return catalog
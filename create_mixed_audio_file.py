@@ -1,16 +1,21 @@
-import array
 import os
 import numpy as np
 import random
 import wave
-import matplotlib.pyplot as plt
 
+from acoustic_index import AcousticIndex
+from corpus_catalog import open_catalog
+from harmonize import common_framerate, harmonize_paths
+from mixing_engine import MixKernel, calculate_adjusted_rms, calculate_rms  # noqa: F401
+from noise_bank import NoiseBank
+from pink_noise import SYNTHETIC_PINK, PinkNoise
+from speech_level import active_speech_level
+from stage_timing import NULL_TIMER, StageTimer, print_summary
+from stimulus_bank import StimulusBank
+from waveform_plots import minmax_envelope, render_waveform_plot
+from wav_reader import open_wav, read_amplitude
 
-def calculate_adjusted_rms(clean_rms, snr):
-    """Calculate the RMS value for the noise based on the SNR."""
-    snr_factor = float(snr) / 20
-    noise_rms = clean_rms / (10 ** snr_factor)
-    return noise_rms
+MIX_KERNEL = MixKernel()
 
 
 def calculate_amplitude(wave_file):
@@ -20,78 +25,125 @@ def calculate_amplitude(wave_file):
     return amplitude
 
 
-def calculate_rms(amplitude):
-    """Calculate the RMS of the amplitude."""
-    return np.sqrt(np.mean(np.square(amplitude), axis=-1))
-
-
 def save_waveform(output_path, params, amplitude):
     """Save the waveform to a file."""
     with wave.Wave_write(output_path) as output_file:
         output_file.setparams(params)  # nchannels, sampwidth, framerate, nframes, comptype, compname
-        output_file.writeframes(array.array('h', amplitude.astype(np.int16)).tobytes())
-
-
-def plot_waveforms(clean_amp, noise_amp, mixed_amp, clean_wav, snr, noise_mode, clean_file):
-    """Plot and save the waveforms as PNG images."""
-    time_axis = np.linspace(0, len(clean_amp) / clean_wav.getframerate(), num=len(clean_amp))
-
-    fig, axs = plt.subplots(3, 1, figsize=(10, 8))
-
-    axs[0].plot(time_axis, clean_amp, label='Clean Signal')
-    axs[0].set_title('Clean Signal')
-    axs[0].set_ylabel('Amplitude')
-    axs[0].legend()
-
-    axs[1].plot(time_axis, noise_amp, label='Noise Signal', color='orange')
-    axs[1].set_title('Noise Signal')
-    axs[1].set_ylabel('Amplitude')
-    axs[1].legend()
-
-    axs[2].plot(time_axis, mixed_amp, label='Mixed Signal', color='green')
-    axs[2].set_title('Mixed Signal')
-    axs[2].set_xlabel('Time (seconds)')
-    axs[2].set_ylabel('Amplitude')
-    axs[2].legend()
+        output_file.writeframes(amplitude.astype(np.int16, copy=False))
 
-    plt.tight_layout()
 
-    fig_filename = f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}.png"
-    plt.savefig(fig_filename)
-    plt.close(fig)
+def plot_waveforms(clean_amp, noise_amp, mixed_amp, framerate, snr, noise_mode, clean_file, plotter=None,
+                   output_dir='.'):
+    """Plot and save the waveforms as PNG images, through the plotter's workers if one is given."""
+    fig_filename = os.path.join(output_dir, f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}.png")
+    signals = [('Clean Signal', clean_amp, None), ('Noise Signal', noise_amp, 'orange'),
+               ('Mixed Signal', mixed_amp, 'green')]
+    if plotter is not None:
+        plotter.submit(fig_filename, framerate, signals)
+        return
 
+    panels = [(title, minmax_envelope(amplitude, framerate), color) for title, amplitude, color in signals]
+    render_waveform_plot((fig_filename, panels))
     print(f"Saved waveform plot as {fig_filename}")
 
 
-def process_waveforms(clean_file, noise_file, noise_mode, snr_list):
-    """Process waveforms by mixing clean and noise files at different SNRs."""
-    clean_wav = wave.open(clean_file, "r")
-    noise_wav = wave.open(noise_file, "r")
-
-    clean_amp = calculate_amplitude(clean_wav)
-    noise_amp = calculate_amplitude(noise_wav)
-
-    clean_rms = calculate_rms(clean_amp)
-
-    start = random.randint(0, len(noise_amp) - len(clean_amp))
-    divided_noise_amp = noise_amp[start: start + len(clean_amp)]
-    noise_rms = calculate_rms(divided_noise_amp)
-
-    for snr in snr_list:
-        adjusted_noise_rms = calculate_adjusted_rms(clean_rms, snr)
-        adjusted_noise_amp = divided_noise_amp * (adjusted_noise_rms / noise_rms)
-        mixed_amp = clean_amp + adjusted_noise_amp
-
-        max_int16 = np.iinfo(np.int16).max
-        min_int16 = np.iinfo(np.int16).min
-        if mixed_amp.max() > max_int16 or mixed_amp.min() < min_int16:
-            reduction_rate = min(max_int16 / mixed_amp.max(), min_int16 / mixed_amp.min())
-            mixed_amp *= reduction_rate
-            clean_amp *= reduction_rate
-
-        save_path = f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}"
-        save_waveform(save_path, clean_wav.getparams(), mixed_amp)
-        #plot_waveforms(clean_amp, adjusted_noise_amp, mixed_amp, clean_wav, snr, noise_mode, clean_file)
+def read_inputs(clean_file, noise_file, noise_bank=None, clean_bank=None, timer=NULL_TIMER, dtype=np.float64):
+    """Decode the clean word as dtype and map the masker; the masker is (None, None) for generated pink noise."""
+    with timer.stage('decode') as stage:
+        clean_params, clean_amp = read_amplitude(clean_file, clean_bank, dtype)
+
+        noise_params, noise_samples = None, None
+        if noise_file not in (None, SYNTHETIC_PINK):
+            if noise_bank is not None:
+                noise_params, noise_samples = noise_bank.get(noise_file)
+            else:
+                noise_params, noise_samples = open_wav(noise_file)
+        stage.nbytes = len(clean_amp) * clean_params.sampwidth
+        stage.samples = len(clean_amp)
+    return clean_params, clean_amp, noise_params, noise_samples
+
+
+def cut_noise(clean_file, clean_params, clean_amp, noise_file, noise_samples, noise_mode, start=None,
+              noise_seed=None, timer=NULL_TIMER, dtype=np.float64):
+    """Return the word-length noise as dtype: a slice of the masker, or generated pink noise (see process_waveforms)."""
+    if noise_samples is not None and len(noise_samples) < len(clean_amp):
+        if noise_mode != 'PinkNoise':
+            raise ValueError(f"{noise_file} is shorter than {clean_file}")
+        print(f"{noise_file} is shorter than {clean_file}; mixing with generated pink noise instead")
+        noise_samples = None
+        start = None
+
+    if noise_samples is None:
+        with timer.stage('generate') as stage:
+            source = PinkNoise(clean_params.framerate, noise_seed)
+            divided_noise_amp = source.read(start or 0, len(clean_amp)).astype(dtype, copy=False)
+            stage.samples = len(divided_noise_amp)
+        return divided_noise_amp
+
+    with timer.stage('slice') as stage:
+        if start is None:
+            start = random.randint(0, len(noise_samples) - len(clean_amp))
+        divided_noise_amp = noise_samples[start: start + len(clean_amp)].astype(dtype)
+        stage.nbytes = len(divided_noise_amp) * noise_samples.itemsize
+        stage.samples = len(divided_noise_amp)
+    return divided_noise_amp
+
+
+def mix_segment(clean_params, clean_amp, divided_noise_amp, snr_list, kernel=MIX_KERNEL, clean_rms=None,
+                level='rms', timer=NULL_TIMER):
+    """Measure the clean and noise levels and mix the noise segment under the clean word at every SNR.
+
+    The returned grid lives in the kernel's buffers until its next call.
+    """
+    with timer.stage('rms') as stage:
+        if clean_rms is None and level == 'active':
+            clean_rms = active_speech_level(clean_amp, clean_params.framerate, clean_params.nchannels)
+        elif clean_rms is None:
+            clean_rms = calculate_rms(clean_amp)
+        noise_rms = calculate_rms(divided_noise_amp)
+        stage.samples = len(divided_noise_amp)
+
+    with timer.stage('mix') as stage:
+        grid = kernel.mix(clean_amp, divided_noise_amp, snr_list, clean_rms, noise_rms)
+        stage.nbytes = grid.mixed.nbytes
+        stage.samples = grid.mixed.size
+    return grid
+
+
+def write_mixes(clean_file, clean_params, clean_amp, divided_noise_amp, grid, snr_list, noise_mode, output_dir='.',
+                plotter=None, timer=NULL_TIMER):
+    """Save every word-length mixture of the grid, with its plot if a plotter is given."""
+    for snr, mixed_amp, pcm, noise_gain in zip(snr_list, grid.mixed, grid.pcm, grid.noise_gains):
+        save_path = os.path.join(output_dir, f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}")
+        with timer.stage('encode', pcm.nbytes, len(pcm)):
+            save_waveform(save_path, clean_params, pcm)
+        if plotter is not None:
+            with timer.stage('plot'):
+                plot_waveforms(clean_amp, divided_noise_amp * noise_gain, mixed_amp, clean_params.framerate, snr,
+                               noise_mode, clean_file, plotter, output_dir)
+
+
+def process_waveforms(clean_file, noise_file, noise_mode, snr_list, noise_bank=None, output_dir='.', start=None,
+                      kernel=MIX_KERNEL, clean_rms=None, plotter=None, timer=NULL_TIMER,
+                      clean_bank=None, level='rms', noise_seed=None):
+    """Process waveforms by mixing clean and noise files at different SNRs.
+
+    level='active' sets the SNR against the active speech level of the clean
+    word instead of its RMS over the whole file, silence included.
+
+    With no noise file (or SYNTHETIC_PINK), and in PinkNoise mode whenever
+    the noise file is shorter than the clean word, the noise is generated
+    pink noise seeded with noise_seed, and start is an offset into it.
+    """
+    timer.begin_file(clean_file)
+    clean_params, clean_amp, _, noise_samples = read_inputs(clean_file, noise_file, noise_bank, clean_bank, timer,
+                                                            kernel.dtype)
+    divided_noise_amp = cut_noise(clean_file, clean_params, clean_amp, noise_file, noise_samples, noise_mode, start,
+                                  noise_seed, timer, kernel.dtype)
+    grid = mix_segment(clean_params, clean_amp, divided_noise_amp, snr_list, kernel, clean_rms, level, timer)
+    write_mixes(clean_file, clean_params, clean_amp, divided_noise_amp, grid, snr_list, noise_mode, output_dir,
+                plotter, timer)
+    timer.end_file()
 
 
 if __name__ == '__main__':
@@ -99,12 +151,31 @@ if __name__ == '__main__':
     # NOISE_FILE = 'Noise/Concat_p4_Nz.wav'
     # NOISE_MODE = 'PinkNoise'
 
-    NOISE_FILE = 'Noise/Concat_p4_Nz.wav'
+    NOISE_FILE = 'Noise/Concat_p4_Nz.wav'  # None generates pink noise of exactly each word's length
     NOISE_MODE = 'PinkNoise'
+    CLEAN_BANK = None  # e.g. 'words.bank' from `python stimulus_bank.py words.bank Words/Target`
 
     SNR_LIST = [-2, -5]
-
-    for file in os.listdir(CLEAN_DIR):
-        if file.endswith(".wav"):
-            CLEAN_FILE = os.path.join(CLEAN_DIR, file)
-            process_waveforms(CLEAN_FILE, NOISE_FILE, NOISE_MODE, SNR_LIST)
+    LEVEL = 'rms'  # 'active' sets the SNR against the active speech level, ignoring silence around the word
+    TRACE_FILE = 'stage_trace.jsonl'  # per-stage timings, one JSON line per stage and file
+
+    noise_bank = NoiseBank()
+    timer = StageTimer(TRACE_FILE)
+    index = AcousticIndex()
+    index.update()
+    index.save()
+    clean_bank = StimulusBank(CLEAN_BANK) if CLEAN_BANK else None
+    clean_files = clean_bank.listing(CLEAN_DIR) if clean_bank else open_catalog().listing(CLEAN_DIR)
+    if clean_files:
+        # bring the words and masker to 16-bit mono at one rate; a bank already holds 16-bit words, so only
+        # the masker is converted to their rate. A converted word is no longer indexed, so its RMS is measured
+        framerate = clean_bank.get(clean_files[0])[0].framerate if clean_bank else common_framerate(clean_files)
+        prepared = harmonize_paths(([] if clean_bank else clean_files) + ([NOISE_FILE] if NOISE_FILE else []),
+                                   framerate)
+        clean_files = [prepared.get(path, path) for path in clean_files]
+        NOISE_FILE = prepared.get(NOISE_FILE, NOISE_FILE)
+    for CLEAN_FILE in clean_files:
+        process_waveforms(CLEAN_FILE, NOISE_FILE, NOISE_MODE, SNR_LIST, noise_bank,
+                          clean_rms=index.level(CLEAN_FILE, LEVEL), timer=timer, clean_bank=clean_bank,
+                          level=LEVEL)
+    print_summary(timer.summary())
@@ -1,98 +1,146 @@
-import array
 import os
 import numpy as np
 import wave
-import matplotlib.pyplot as plt
 
+from acoustic_index import AcousticIndex
+from corpus_catalog import open_catalog
+from harmonize import common_framerate, harmonize_paths
+from create_mixed_audio_file import mix_segment, read_inputs
+from masker_scheduler import load_schedule, save_schedule, schedule_maskers
+from mixing_engine import MixKernel, calculate_adjusted_rms  # noqa: F401
+from noise_bank import NoiseBank
+from stage_timing import NULL_TIMER, StageTimer, print_summary
+from stimulus_bank import StimulusBank
+from waveform_plots import minmax_envelope, render_waveform_plot
+from wav_reader import read_format
 
-def calculate_adjusted_rms(clean_rms, snr):
-    snr_ratio = float(snr) / 20
-    noise_rms = clean_rms / (10 ** snr_ratio)
-    return noise_rms
+BLOCK_SIZE = 65536
+MIX_KERNEL = MixKernel()
 
 
-def calculate_amplitude(wav_file):
-    buffer = wav_file.readframes(wav_file.getnframes())
-    amplitude = np.frombuffer(buffer, dtype="int16").astype(np.float64)
-    return amplitude
+def sample_count(path, index=None, bank=None):
+    """Samples in a file, frames x channels, the unit of AcousticIndex.length and of the start offsets.
 
-
-def calculate_rms(amplitude):
-    return np.sqrt(np.mean(np.square(amplitude), axis=-1))
+    Taken from the index if it has the file, else from the bank (a
+    StimulusBank entry needs no file on disk), else from the WAV header.
+    """
+    if index is not None and path in index:
+        return index.length(path)
+    if bank is not None and path in bank:
+        return len(bank.get(path)[1])
+    fmt = read_format(path)
+    return fmt.data_size // (fmt.bits // 8)
 
 
 def save_waveform(output_path, params, amplitude):
     with wave.Wave_write(output_path) as output_file:
         output_file.setparams(params)
-        output_file.writeframes(array.array('h', amplitude.astype(np.int16)).tobytes())
-
-
-def plot_waveforms(time_axis, clean_amp, adjusted_noise_amp, mixed_amp, output_path):
-    fig, axs = plt.subplots(3, 1, figsize=(10, 8))
-
-    axs[0].plot(time_axis, clean_amp, label='Clean Signal')
-    axs[0].set_title('Clean Signal')
-    axs[0].set_ylabel('Amplitude')
-    axs[0].legend()
+        output_file.writeframes(amplitude.astype(np.int16, copy=False))
 
-    axs[1].plot(time_axis, adjusted_noise_amp, label='Noise Signal', color='orange')
-    axs[1].set_title('Noise Signal')
-    axs[1].set_ylabel('Amplitude')
-    axs[1].legend()
-
-    axs[2].plot(time_axis, mixed_amp, label='Mixed Signal', color='green')
-    axs[2].set_title('Mixed Signal')
-    axs[2].set_xlabel('Time (seconds)')
-    axs[2].set_ylabel('Amplitude')
-    axs[2].legend()
-
-    plt.tight_layout()
-    plt.savefig(output_path)
-    plt.close(fig)
 
+def save_waveform_streaming(output_path, params, noise_samples, gain, start, mixed_amp, block_size=BLOCK_SIZE):
+    # scale the masker block by block and splice the mixed segment in at start,
+    # so memory stays at a few blocks however long the masker is
+    end = start + len(mixed_amp)
+    block_size -= block_size % params.nchannels
+    work = np.empty(block_size, dtype=mixed_amp.dtype)
+    out = np.empty(block_size, dtype=np.int16)
+    with wave.Wave_write(output_path) as output_file:
+        output_file.setparams(params)
+        for block_start in range(0, len(noise_samples), block_size):
+            block_end = min(block_start + block_size, len(noise_samples))
+            n = block_end - block_start
+            np.multiply(noise_samples[block_start:block_end], gain, out=work[:n])
+
+            splice_start = max(start, block_start)
+            splice_end = min(end, block_end)
+            if splice_start < splice_end:
+                segment = mixed_amp[splice_start - start:splice_end - start]
+                work[splice_start - block_start:splice_end - block_start] = segment
+
+            out[:n] = work[:n]
+            output_file.writeframes(out[:n])
+
+
+def plot_waveforms(framerate, clean_amp, adjusted_noise_amp, mixed_amp, output_path, plotter=None):
+    signals = [('Clean Signal', clean_amp, None), ('Noise Signal', adjusted_noise_amp, 'orange'),
+               ('Mixed Signal', mixed_amp, 'green')]
+    if plotter is not None:
+        plotter.submit(output_path, framerate, signals)
+        return
+
+    panels = [(title, minmax_envelope(amplitude, framerate), color) for title, amplitude, color in signals]
+    render_waveform_plot((output_path, panels))
     print(f"Saved waveform plot as {output_path}")
 
 
-def process_audio(clean_file, noise_file, snr_list, noise_mode='SingleTalker'):
-    clean_wav = wave.open(clean_file, "r")
-    noise_wav = wave.open(noise_file, "r")
-
-    clean_amp = calculate_amplitude(clean_wav)
-    noise_amp = calculate_amplitude(noise_wav)
-
-    clean_rms = calculate_rms(clean_amp)
+def cut_masker(clean_amp, noise_samples, start=None, timer=NULL_TIMER, dtype=np.float64):
+    """Return (start, segment): the stretch of the masker the word goes into, centred unless start is given."""
+    with timer.stage('slice') as stage:
+        if start is None:
+            start = (len(noise_samples) - len(clean_amp)) // 2
+        divided_noise_amp = noise_samples[start:start + len(clean_amp)].astype(dtype)
+        stage.nbytes = len(clean_amp) * noise_samples.itemsize
+        stage.samples = len(clean_amp)
+    return start, divided_noise_amp
+
+
+def write_streaming_mixes(clean_file, clean_params, clean_amp, noise_params, noise_samples, divided_noise_amp, start,
+                          grid, snr_list, noise_mode='SingleTalker', output_dir='.', block_size=BLOCK_SIZE,
+                          plotter=None, timer=NULL_TIMER):
+    """Stream every full-length mixture of the grid to disk, with its plot if a plotter is given."""
+    for snr, mixed_amp, noise_gain, clip_gain in zip(snr_list, grid.mixed, grid.noise_gains, grid.clip_gains):
+        save_path = os.path.join(output_dir, f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}")
+        # scaling, splicing and writing happen block by block, so they are timed together
+        with timer.stage('encode', len(noise_samples) * noise_params.sampwidth, len(noise_samples)):
+            save_waveform_streaming(save_path, noise_params, noise_samples, noise_gain * clip_gain, start, mixed_amp,
+                                    block_size)
+
+        if plotter is not None:
+            with timer.stage('plot'):
+                plot_waveforms(clean_params.framerate, clean_amp, divided_noise_amp * noise_gain, mixed_amp,
+                               f"{save_path}.png", plotter)
+
+
+def process_audio(clean_file, noise_file, snr_list, noise_mode='SingleTalker', noise_bank=None, output_dir='.',
+                  start=None, kernel=MIX_KERNEL, clean_rms=None, plotter=None, timer=NULL_TIMER, clean_bank=None,
+                  level='rms'):
+    timer.begin_file(clean_file)
+    clean_params, clean_amp, noise_params, noise_amp = read_inputs(clean_file, noise_file, noise_bank, clean_bank,
+                                                                   timer, kernel.dtype)
+    start, divided_noise_amp = cut_masker(clean_amp, noise_amp, start, timer, kernel.dtype)
+    grid = mix_segment(clean_params, clean_amp, divided_noise_amp, snr_list, kernel, clean_rms, level, timer)
 
     noise_len = len(noise_amp)
-    clean_len = len(clean_amp)
-    start = (noise_len - clean_len) // 2
-    end = start + clean_len
-    divided_noise_amp = noise_amp[start:end]
-    noise_rms = calculate_rms(divided_noise_amp)
-
-    for snr in snr_list:
-        adjusted_noise_rms = calculate_adjusted_rms(clean_rms, snr)
-        adjustment_factor = adjusted_noise_rms / noise_rms
-        adjusted_noise_amp = noise_amp * adjustment_factor
-
-        mixed_amp = clean_amp + adjusted_noise_amp[start:end]
-
-        max_int16 = np.iinfo(np.int16).max
-        min_int16 = np.iinfo(np.int16).min
-        if mixed_amp.max() > max_int16 or mixed_amp.min() < min_int16:
-            reduction_rate = min(max_int16 / mixed_amp.max(), min_int16 / mixed_amp.min())
-            mixed_amp *= reduction_rate
-            clean_amp *= reduction_rate
-            adjusted_noise_amp *= reduction_rate
-
-        new_noise_amp = adjusted_noise_amp.copy()
-        new_noise_amp[start:end] = mixed_amp
-
-        save_path = f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}"
-        save_waveform(save_path, noise_wav.getparams(), new_noise_amp)
-
-        # time_axis = np.linspace(0, len(clean_amp) / clean_wav.getframerate(), num=len(clean_amp))
-        # fig_filename = f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}.png"
-        # plot_waveforms(time_axis, clean_amp, adjusted_noise_amp[start:end], mixed_amp, fig_filename)
+    end = start + len(clean_amp)
+    for snr, mixed_amp, noise_gain, clip_gain in zip(snr_list, grid.mixed, grid.noise_gains, grid.clip_gains):
+        with timer.stage('splice', noise_len * 8, noise_len):
+            new_noise_amp = noise_amp * (noise_gain * clip_gain)
+            new_noise_amp[start:end] = mixed_amp
+
+        save_path = os.path.join(output_dir, f"{noise_mode}_SNR_{snr}_dB_{os.path.basename(clean_file)}")
+        with timer.stage('encode', noise_len * noise_params.sampwidth, noise_len):
+            save_waveform(save_path, noise_params, new_noise_amp)
+
+        if plotter is not None:
+            with timer.stage('plot'):
+                plot_waveforms(clean_params.framerate, clean_amp, divided_noise_amp * noise_gain, mixed_amp,
+                               f"{save_path}.png", plotter)
+    timer.end_file()
+
+
+def process_audio_streaming(clean_file, noise_file, snr_list, noise_mode='SingleTalker', noise_bank=None,
+                            output_dir='.', block_size=BLOCK_SIZE, start=None, kernel=MIX_KERNEL,
+                            clean_rms=None, plotter=None, timer=NULL_TIMER, clean_bank=None, level='rms'):
+    timer.begin_file(clean_file)
+    clean_params, clean_amp, noise_params, noise_samples = read_inputs(clean_file, noise_file, noise_bank,
+                                                                       clean_bank, timer, kernel.dtype)
+    start, divided_noise_amp = cut_masker(clean_amp, noise_samples, start, timer, kernel.dtype)
+    # only the word-length segment is mixed in memory; the rest of the masker is streamed
+    grid = mix_segment(clean_params, clean_amp, divided_noise_amp, snr_list, kernel, clean_rms, level, timer)
+    write_streaming_mixes(clean_file, clean_params, clean_amp, noise_params, noise_samples, divided_noise_amp, start,
+                          grid, snr_list, noise_mode, output_dir, block_size, plotter, timer)
+    timer.end_file()
 
 
 if __name__ == '__main__':
@@ -102,13 +150,39 @@ if __name__ == '__main__':
     # process_audio(clean_file, noise_file, snr_list)
 
     snr_list = [-2, -5]
+    level = 'rms'  # 'active' sets the SNR against the active speech level, ignoring silence around the word
     dir_clean = 'Words/Target/F3'  # get all wav files in the following directory
     # dir_noise = 'Noise/Concat_p4_Nz.wav'
     dir_noise = 'Sentences/F3'
     # noise_file = 'Noise/Concat_p4_Nz.wav'
-    for file in os.listdir(dir_clean):
-        if file.endswith(".wav"):
-            clean_file = os.path.join(dir_clean, file)
-            # get random noise file
-            noise_file = os.path.join(dir_noise, np.random.choice(os.listdir(dir_noise)))
-            process_audio(clean_file, noise_file, snr_list)
\ No newline at end of file
+    clean_bank_file = None  # e.g. 'words.bank' from `python stimulus_bank.py words.bank Words/Target`
+    trace_file = 'stage_trace.jsonl'  # per-stage timings, one JSON line per stage and file
+    noise_bank = NoiseBank()
+    timer = StageTimer(trace_file)
+    index = AcousticIndex()
+    index.update()
+    index.save()
+    clean_bank = StimulusBank(clean_bank_file) if clean_bank_file else None
+    schedule_file = 'masker_schedule.json'  # delete to draw a new assignment
+    if os.path.exists(schedule_file):
+        assignments = load_schedule(schedule_file)
+    else:
+        catalog = open_catalog()
+        clean_files = clean_bank.listing(dir_clean) if clean_bank else catalog.listing(dir_clean)
+        masker_files = catalog.listing(dir_noise)
+        if clean_files:
+            # bring the words and maskers to 16-bit mono at one rate before any length is taken; a bank already
+            # holds 16-bit words, so only the maskers are converted to their rate
+            framerate = clean_bank.get(clean_files[0])[0].framerate if clean_bank else common_framerate(clean_files)
+            prepared = harmonize_paths(([] if clean_bank else clean_files) + masker_files, framerate)
+            clean_files = [prepared.get(path, path) for path in clean_files]
+            masker_files = [prepared[path] for path in masker_files]
+        lengths = {path: sample_count(path, index, clean_bank) for path in clean_files + masker_files}
+        assignments = schedule_maskers(clean_files, masker_files, lengths)
+        save_schedule(schedule_file, assignments)
+
+    for assignment in assignments:
+        process_audio_streaming(assignment.clean_file, assignment.noise_file, snr_list, noise_bank=noise_bank,
+                                start=assignment.start, clean_rms=index.level(assignment.clean_file, level),
+                                timer=timer, clean_bank=clean_bank, level=level)
+    print_summary(timer.summary())
@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from acoustic_index import AcousticIndex
+from build_manifest import MANIFEST_NAME, BuildManifest
+from corpus_catalog import open_catalog
+from create_mixed_audio_file import cut_noise, mix_segment, process_waveforms, read_inputs, write_mixes
+from create_mixed_audio_file_keep_length import cut_masker, process_audio_streaming, sample_count, write_streaming_mixes
+from harmonize import common_framerate, harmonize_paths
+from masker_scheduler import save_schedule, schedule_maskers
+from mixing_engine import MixKernel
+from noise_bank import DEFAULT_MAX_BYTES, NoiseBank
+from pink_noise import SYNTHETIC_PINK
+from pipeline import run_pipeline
+from speech_level import LEVELS
+from stage_timing import NULL_TIMER, StageTimer, print_summary, summarize_trace
+from waveform_plots import WaveformPlotter, render_contact_sheets
+
+TARGET_DIR = os.path.join('Words', 'Target')
+OUTPUT_DIR = 'GeneratedSNR'
+SNR_LIST = [-2, -5]
+# bump when a change to the mixers should invalidate every generated file
+GENERATOR_VERSION = 1
+SCHEDULE_NAME = 'masker_schedule.json'
+
+# noise mode -> (mixer, masker glob); '{speaker}' is filled in per job
+NOISE_MODES = {
+    'PinkNoise': ('word_length', os.path.join('Noise', 'Concat_p*_Nz.wav')),
+    'Environment': ('word_length', os.path.join('Environment', '*.wav')),
+    'SingleTalker': ('keep_length', os.path.join('Sentences', '{speaker}', '*.wav')),
+}
+
+Job = namedtuple('Job', ['speaker', 'clean_file', 'noise_mode', 'masker_files', 'snr_list', 'output_dir', 'seed',
+                         'noise_file', 'start', 'clean_rms', 'level'], defaults=[None, None, None, 'rms'])
+
+_worker_bank = None
+_worker_kernel = None
+_worker_plotter = None
+_worker_timer = NULL_TIMER
+
+
+def job_seed(base_seed, speaker, clean_file, noise_mode):
+    """Derive a stable 32-bit seed for one job, independent of scheduling."""
+    key = f"{base_seed}:{speaker}:{os.path.basename(clean_file)}:{noise_mode}"
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:4], 'little')
+
+
+def list_speakers(catalog=None):
+    catalog = catalog if catalog is not None else open_catalog()
+    return catalog.speakers('target')
+
+
+def build_jobs(speakers, noise_modes, snr_list, output_dir=OUTPUT_DIR, base_seed=0, target_dir=TARGET_DIR,
+               index=None, catalog=None, level='rms', synthetic_pink=False):
+    """Expand speakers x noise modes into one job per clean word, in a fixed order.
+
+    PinkNoise jobs mix against generated pink noise instead of the masker
+    files with synthetic_pink, or when there are no PinkNoise files.
+    """
+    catalog = catalog if catalog is not None else open_catalog()
+    jobs = []
+    for speaker in speakers:
+        clean_files = catalog.listing(os.path.join(target_dir, speaker))
+        for noise_mode in noise_modes:
+            _, masker_glob = NOISE_MODES[noise_mode]
+            masker_files = tuple(catalog.match(masker_glob.format(speaker=speaker)))
+            pink = noise_mode == 'PinkNoise' and (synthetic_pink or not masker_files)
+            if pink:
+                masker_files = ()
+            elif not masker_files:
+                print(f"No maskers for {noise_mode} / {speaker}, skipping")
+                continue
+            job_output_dir = os.path.join(output_dir, noise_mode, speaker)
+            for clean_file in clean_files:
+                seed = job_seed(base_seed, speaker, clean_file, noise_mode)
+                clean_rms = index.level(clean_file, level) if index is not None else None
+                jobs.append(Job(speaker, clean_file, noise_mode, masker_files, list(snr_list), job_output_dir, seed,
+                                noise_file=SYNTHETIC_PINK if pink else None, start=0 if pink else None,
+                                clean_rms=clean_rms, level=level))
+    return jobs
+
+
+def harmonize_jobs(jobs, framerate=None, workers=None):
+    """Point every job at 16-bit mono copies of its clean word and maskers at one sample rate.
+
+    framerate defaults to the most common rate of the clean words. Sources
+    already in that format are used as they are; the others are converted
+    once into the harmonized cache. A converted clean word drops its indexed
+    RMS, which was measured on the source.
+    """
+    if not jobs:
+        return jobs
+    if framerate is None:
+        framerate = common_framerate({job.clean_file for job in jobs})
+    paths = {job.clean_file for job in jobs}
+    for job in jobs:
+        paths.update(job.masker_files)
+    prepared = harmonize_paths(paths, framerate, workers=workers)
+
+    harmonized = []
+    for job in jobs:
+        clean_file = prepared[job.clean_file]
+        harmonized.append(job._replace(clean_file=clean_file,
+                                       masker_files=tuple(prepared[path] for path in job.masker_files),
+                                       clean_rms=job.clean_rms if clean_file == job.clean_file else None))
+    converted = sum(source != path for source, path in prepared.items())
+    print(f"Harmonized {converted} of {len(prepared)} files to 16-bit mono at {framerate} Hz")
+    return harmonized
+
+
+def schedule_keep_length(jobs, index=None, base_seed=0):
+    """Assign keep-length maskers per speaker in one batch, so reuse is balanced and segments do not overlap."""
+    groups = {}
+    for i, job in enumerate(jobs):
+        mixer, _ = NOISE_MODES[job.noise_mode]
+        if mixer == 'keep_length':
+            groups.setdefault((job.speaker, job.noise_mode), []).append(i)
+
+    jobs = list(jobs)
+    for (speaker, noise_mode), members in groups.items():
+        clean_files = [jobs[i].clean_file for i in members]
+        masker_files = list(jobs[members[0]].masker_files)
+        lengths = {path: sample_count(path, index) for path in clean_files + masker_files}
+        seed = job_seed(base_seed, speaker, '', noise_mode)
+        assignments = schedule_maskers(clean_files, masker_files, lengths, seed)
+        for i, assignment in zip(members, assignments):
+            jobs[i] = jobs[i]._replace(noise_file=assignment.noise_file, start=assignment.start)
+
+        output_dir = jobs[members[0]].output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        save_schedule(os.path.join(output_dir, SCHEDULE_NAME), assignments, seed)
+    return jobs
+
+
+def plan_job(job, index=None):
+    """Fix the masker and segment offset of a job from its seed, reading at most WAV headers."""
+    if job.noise_file is not None:
+        return job
+    np.random.seed(job.seed)
+    noise_file = str(np.random.choice(job.masker_files))
+
+    clean_len = sample_count(job.clean_file, index)
+    noise_len = sample_count(noise_file, index)
+    mixer, _ = NOISE_MODES[job.noise_mode]
+    if noise_len < clean_len:
+        if job.noise_mode == 'PinkNoise':
+            # generated pink noise is never too short
+            return job._replace(noise_file=SYNTHETIC_PINK, start=0)
+        raise ValueError(f"{job.noise_mode} masker {noise_file} ({noise_len} samples) is shorter than "
+                         f"{job.clean_file} ({clean_len} samples)")
+    if mixer == 'keep_length':
+        start = (noise_len - clean_len) // 2
+    else:
+        start = random.Random(job.seed).randint(0, noise_len - clean_len)
+    return job._replace(noise_file=noise_file, start=start)
+
+
+def output_path(job, snr):
+    return os.path.join(job.output_dir, f"{job.noise_mode}_SNR_{snr}_dB_{os.path.basename(job.clean_file)}")
+
+
+def output_record(manifest, job, snr, dtype=np.float64):
+    mixer, _ = NOISE_MODES[job.noise_mode]
+    # generated noise is identified by its seed, as there is no file to hash
+    masker = f"{SYNTHETIC_PINK} {job.seed}" if job.noise_file == SYNTHETIC_PINK else manifest.digest(job.noise_file)
+    params = {'mixer': mixer, 'dtype': np.dtype(dtype).name, 'version': GENERATOR_VERSION}
+    # only recorded when not the default, so outputs built before levels were selectable stay up to date
+    if job.level != 'rms':
+        params['level'] = job.level
+    return {
+        'clean': manifest.digest(job.clean_file),
+        'masker': masker,
+        'offset': job.start,
+        'snr': snr,
+        'params': params,
+    }
+
+
+def stale_jobs(manifest, jobs, dtype=np.float64, index=None):
+    """Plan every job and drop the SNRs whose outputs are already up to date."""
+    stale = []
+    for job in jobs:
+        job = plan_job(job, index)
+        snr_list = [snr for snr in job.snr_list
+                    if not manifest.is_up_to_date(output_path(job, snr),
+                                                  output_record(manifest, job, snr, dtype))]
+        if snr_list:
+            stale.append(job._replace(snr_list=snr_list))
+    return stale
+
+
+def _init_worker(max_bytes, dtype, plots, trace_path):
+    global _worker_bank, _worker_kernel, _worker_plotter, _worker_timer
+    _worker_bank = NoiseBank(max_bytes)
+    _worker_kernel = MixKernel(dtype)
+    # the pool already spreads jobs over cores, so each worker renders its plots inline
+    _worker_plotter = WaveformPlotter(workers=0) if plots else None
+    # every worker appends whole files' worth of lines to the same trace
+    _worker_timer = StageTimer(trace_path) if trace_path else NULL_TIMER
+
+
+def run_job(job):
+    """Mix one clean word against its masker at every SNR of the job."""
+    job = plan_job(job)
+    os.makedirs(job.output_dir, exist_ok=True)
+
+    mixer, _ = NOISE_MODES[job.noise_mode]
+    if mixer == 'keep_length':
+        process_audio_streaming(job.clean_file, job.noise_file, job.snr_list, job.noise_mode, _worker_bank,
+                                job.output_dir, start=job.start, kernel=_worker_kernel, clean_rms=job.clean_rms,
+                                plotter=_worker_plotter, timer=_worker_timer, level=job.level)
+    else:
+        process_waveforms(job.clean_file, job.noise_file, job.noise_mode, job.snr_list, _worker_bank,
+                          job.output_dir, start=job.start, kernel=_worker_kernel, clean_rms=job.clean_rms,
+                          plotter=_worker_plotter, timer=_worker_timer, level=job.level, noise_seed=job.seed)
+    return job
+
+
+class PipelineStages:
+    """The steps of run_job split into a reader, a mixer and a writer stage for run_pipeline.
+
+    Each stage is called from its own thread and keeps its own state: the
+    reader the noise bank, the mixer the mix kernel, the writer the plotter.
+    Each has its own stage timer too, all appending to the same trace.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, dtype=np.float64, plots=False, trace_path=None):
+        self.bank = NoiseBank(max_bytes)
+        self.kernel = MixKernel(dtype)
+        self.plotter = WaveformPlotter() if plots else None
+        self.timers = [StageTimer(trace_path) if trace_path else NULL_TIMER for _ in range(3)]
+
+    def close(self):
+        if self.plotter is not None:
+            self.plotter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, job):
+        """Plan a job, decode its clean word and copy its noise segment out of the mapped masker."""
+        timer = self.timers[0]
+        job = plan_job(job)
+        mixer, _ = NOISE_MODES[job.noise_mode]
+        timer.begin_file(job.clean_file)
+        dtype = self.kernel.dtype
+        clean_params, clean_amp, noise_params, noise_samples = read_inputs(job.clean_file, job.noise_file, self.bank,
+                                                                           timer=timer, dtype=dtype)
+        if mixer == 'keep_length':
+            _, segment = cut_masker(clean_amp, noise_samples, job.start, timer, dtype)
+        else:
+            segment = cut_noise(job.clean_file, clean_params, clean_amp, job.noise_file, noise_samples,
+                                job.noise_mode, job.start, job.seed, timer, dtype)
+        timer.end_file()
+        return job, clean_params, clean_amp, noise_params, noise_samples, segment
+
+    def mix(self, task):
+        """Mix a read job at all its SNRs, copying the grid out of the kernel's reused buffers."""
+        timer = self.timers[1]
+        job, clean_params, clean_amp, _, _, segment = task
+        timer.begin_file(job.clean_file)
+        grid = mix_segment(clean_params, clean_amp, segment, job.snr_list, self.kernel, job.clean_rms, job.level,
+                           timer)
+        grid = grid._replace(mixed=grid.mixed.copy(), pcm=grid.pcm.copy())
+        timer.end_file()
+        return task, grid
+
+    def write(self, mixed):
+        """Encode every SNR of a mixed job to disk, exactly as run_job would."""
+        timer = self.timers[2]
+        (job, clean_params, clean_amp, noise_params, noise_samples, segment), grid = mixed
+        os.makedirs(job.output_dir, exist_ok=True)
+        mixer, _ = NOISE_MODES[job.noise_mode]
+        timer.begin_file(job.clean_file)
+        if mixer == 'keep_length':
+            write_streaming_mixes(job.clean_file, clean_params, clean_amp, noise_params, noise_samples, segment,
+                                  job.start, grid, job.snr_list, job.noise_mode, job.output_dir,
+                                  plotter=self.plotter, timer=timer)
+        else:
+            write_mixes(job.clean_file, clean_params, clean_amp, segment, grid, job.snr_list, job.noise_mode,
+                        job.output_dir, self.plotter, timer)
+        timer.end_file()
+        return job
+
+
+def generate(jobs, workers=None, max_bytes=DEFAULT_MAX_BYTES, manifest=None, dtype=np.float64, index=None,
+             plots=False, trace_path=None, pipeline=False):
+    """Run jobs over a process pool; each worker keeps its own noise bank and mix kernel.
+
+    With pipeline, jobs run in this process instead, through a reader, a
+    mixer and a writer thread, so disk reads and writes overlap the mixing.
+    With a manifest, outputs that are already up to date are skipped and
+    the manifest is saved even if the run is interrupted.
+    """
+    if manifest is not None:
+        total = len(jobs)
+        jobs = stale_jobs(manifest, jobs, dtype, index)
+        print(f"{total - len(jobs)} of {total} jobs up to date")
+
+    def finished(job):
+        print(f"Mixed {job.clean_file} with {job.noise_file}")
+        if manifest is not None:
+            for snr in job.snr_list:
+                manifest.update(output_path(job, snr), output_record(manifest, job, snr, dtype))
+
+    # the trace is only ever appended to, so remember where this run's lines start
+    trace_offset = os.path.getsize(trace_path) if trace_path is not None and os.path.exists(trace_path) else 0
+    try:
+        if pipeline:
+            with PipelineStages(max_bytes, dtype, plots, trace_path) as stages:
+                for job in run_pipeline(jobs, stages.read, stages.mix, stages.write):
+                    finished(job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(max_bytes, dtype, plots, trace_path)) as executor:
+                for job in executor.map(run_job, jobs, chunksize=8):
+                    finished(job)
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+    if trace_path is not None and os.path.exists(trace_path):
+        print_summary(summarize_trace(trace_path, trace_offset))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate mixed stimuli for every speaker in Words/Target.")
+    parser.add_argument('--speakers', nargs='+', default=None)
+    parser.add_argument('--modes', nargs='+', default=list(NOISE_MODES), choices=list(NOISE_MODES))
+    parser.add_argument('--snr', nargs='+', type=int, default=SNR_LIST)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help="regenerate every output, ignoring the build manifest")
+    parser.add_argument('--float32', action='store_true', help="mix in float32 to halve working memory")
+    parser.add_argument('--plots', action='store_true', help="save a waveform plot next to every output")
+    parser.add_argument('--contact-sheets', action='store_true', help="save one waveform sheet per speaker and SNR")
+    parser.add_argument('--trace', default=None, help="append per-stage timings to this JSON-lines file")
+    parser.add_argument('--rate', type=int, default=None,
+                        help="sample rate to mix at; defaults to the most common rate of the clean words")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="mix in this process with overlapped reader, mixer and writer threads instead of a pool")
+    parser.add_argument('--synthetic-pink', action='store_true',
+                        help="mix PinkNoise against generated pink noise instead of the Noise folder's files")
+    parser.add_argument('--level', default='rms', choices=LEVELS,
+                        help="clean level the SNR is set against: RMS of the whole file or the active speech level")
+    args = parser.parse_args()
+
+    catalog = open_catalog()
+    index = AcousticIndex()
+    print(f"Measured {index.update()} new or changed files for the acoustic index")
+    index.save()
+
+    speakers = args.speakers or list_speakers(catalog)
+    jobs = build_jobs(speakers, args.modes, args.snr, args.output_dir, args.seed, index=index, catalog=catalog,
+                      level=args.level, synthetic_pink=args.synthetic_pink)
+    jobs = harmonize_jobs(jobs, args.rate, args.workers)
+    jobs = schedule_keep_length(jobs, index, args.seed)
+    print(f"{len(jobs)} jobs over {len(speakers)} speakers")
+    manifest = BuildManifest(os.path.join(args.output_dir, MANIFEST_NAME))
+    if args.force:
+        manifest.outputs.clear()
+    generate(jobs, args.workers, manifest=manifest, dtype=np.float32 if args.float32 else np.float64, index=index,
+             plots=args.plots, trace_path=args.trace, pipeline=args.pipeline)
+    if args.contact_sheets:
+        render_contact_sheets(args.output_dir, args.workers)
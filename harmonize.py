@@ -0,0 +1,115 @@
+import hashlib
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sample_format import BLOCK_FRAMES, FORMATS, decode, encode, sample_format, wav_header
+from wav_reader import WAVE_FORMAT_PCM, read_format
+
+HARMONIZED_DIR = '.harmonized'
+
+
+def cache_path(path, framerate, nchannels=1, cache_dir=HARMONIZED_DIR):
+    """Path of the prepared copy of path, keyed by the source's identity and the target format.
+
+    The file keeps its basename, so outputs named after a clean word are
+    the same whether or not it had to be converted.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{framerate}:{nchannels}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16], os.path.basename(path))
+
+
+def remix(samples, nchannels):
+    """Down-mix (frames, channels) samples to mono by averaging, or spread mono over nchannels."""
+    if samples.shape[1] == nchannels:
+        return samples
+    if nchannels == 1:
+        return samples.mean(axis=1, keepdims=True)
+    if samples.shape[1] == 1:
+        return np.repeat(samples, nchannels, axis=1)
+    raise ValueError(f"cannot map {samples.shape[1]} channels to {nchannels}")
+
+
+def resample(samples, source_rate, target_rate):
+    """Polyphase-resample (frames, channels) samples by the reduced target/source ratio."""
+    from scipy.signal import resample_poly
+    g = math.gcd(source_rate, target_rate)
+    return resample_poly(samples, target_rate // g, source_rate // g, axis=0)
+
+
+def read_blocks(path, fmt, block_frames=BLOCK_FRAMES):
+    """Yield the data chunk of a WAV file as decoded (frames, channels) float blocks."""
+    source = sample_format(fmt.format_tag, fmt.bits)
+    with open(path, 'rb') as f:
+        f.seek(fmt.data_offset)
+        remaining = fmt.data_size
+        while remaining:
+            data = f.read(min(remaining, block_frames * fmt.block_align))
+            if not data:
+                raise ValueError(f"{path} ends before its data chunk does")
+            remaining -= len(data)
+            yield decode(data, source).reshape(-1, fmt.nchannels)
+
+
+def harmonize(path, framerate, nchannels=1, cache_dir=HARMONIZED_DIR, block_frames=BLOCK_FRAMES):
+    """Return a 16-bit PCM version of path at framerate and nchannels.
+
+    Files already in that format are returned as they are; anything else is
+    converted once into the cache and the cached copy is returned from then on.
+    A change of sample format or channel count runs block by block, like
+    sample_format.convert_file; resampling filters across block edges, so a
+    file at another rate is down-mixed block by block and then resampled whole.
+    """
+    fmt = read_format(path)
+    if fmt.format_tag == WAVE_FORMAT_PCM and fmt.bits == 16 and fmt.framerate == framerate \
+            and fmt.nchannels == nchannels:
+        return path
+
+    prepared = cache_path(path, framerate, nchannels, cache_dir)
+    if os.path.exists(prepared):
+        return prepared
+
+    blocks = (remix(block, nchannels) for block in read_blocks(path, fmt, block_frames))
+    if fmt.framerate != framerate:
+        blocks = [resample(np.concatenate(list(blocks) or [np.zeros((0, nchannels))]), fmt.framerate, framerate)]
+        nframes = len(blocks[0])
+    else:
+        nframes = fmt.data_size // fmt.block_align
+
+    target = FORMATS['i16']
+    os.makedirs(os.path.dirname(prepared), exist_ok=True)
+    # workers may prepare the same source at once, so each writes its own temporary file
+    tmp_path = f"{prepared}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(wav_header(target, nchannels, framerate, nframes))
+            for block in blocks:
+                f.write(encode(block.ravel(), target))
+        os.replace(tmp_path, prepared)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return prepared
+
+
+def _harmonize_task(task):
+    return harmonize(*task)
+
+
+def harmonize_paths(paths, framerate, nchannels=1, cache_dir=HARMONIZED_DIR, workers=None):
+    """Prepare every distinct path in a process pool and return a source -> prepared path mapping."""
+    paths = sorted(set(paths))
+    tasks = [(path, framerate, nchannels, cache_dir) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(paths, executor.map(_harmonize_task, tasks, chunksize=8)))
+
+
+def common_framerate(paths):
+    """The most frequent sample rate among paths, or None if there are no paths."""
+    counts = Counter(read_format(path).framerate for path in paths).most_common(1)
+    return counts[0][0] if counts else None
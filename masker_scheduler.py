@@ -0,0 +1,80 @@
+import bisect
+import json
+import os
+import random
+from collections import namedtuple
+
+Assignment = namedtuple('Assignment', ['clean_file', 'noise_file', 'start'])
+
+
+def masker_speaker(path):
+    return os.path.basename(os.path.dirname(path))
+
+
+def free_offset(intervals, masker_len, clean_len):
+    """Find the offset closest to the centre where a segment fits between the used intervals."""
+    centre = (masker_len - clean_len) // 2
+    best = None
+    gap_start = 0
+    for used_start, used_end in sorted(intervals) + [(masker_len, masker_len)]:
+        if used_start - gap_start >= clean_len:
+            offset = min(max(centre, gap_start), used_start - clean_len)
+            if best is None or abs(offset - centre) < abs(best - centre):
+                best = offset
+        gap_start = max(gap_start, used_end)
+    return best
+
+
+def schedule_maskers(clean_files, masker_files, lengths, seed=0):
+    """Assign every clean file a masker and segment offset in one batch.
+
+    Only maskers at least as long as the clean file are eligible. Among
+    those, the masker used least so far wins, then the least used speaker,
+    then a seeded tie-break. Segments in the same masker do not overlap
+    while there is room; once every eligible masker is full, the least
+    used one is reused at its centre.
+    """
+    rng = random.Random(seed)
+    maskers = sorted(masker_files, key=lambda path: (lengths[path], path))
+    masker_lengths = [lengths[path] for path in maskers]
+    tie_break = {path: rng.random() for path in maskers}
+
+    uses = {path: 0 for path in maskers}
+    speaker_uses = {masker_speaker(path): 0 for path in maskers}
+    intervals = {path: [] for path in maskers}
+
+    assignments = {}
+    # longest words first, since they have the fewest eligible maskers
+    for clean_file in sorted(clean_files, key=lambda path: (-lengths[path], path)):
+        clean_len = lengths[clean_file]
+        eligible = maskers[bisect.bisect_left(masker_lengths, clean_len):]
+        if not eligible:
+            raise ValueError(f"No masker is long enough for {clean_file} ({clean_len} samples)")
+
+        candidates = sorted(eligible, key=lambda path: (uses[path], speaker_uses[masker_speaker(path)],
+                                                        tie_break[path]))
+        for noise_file in candidates:
+            start = free_offset(intervals[noise_file], lengths[noise_file], clean_len)
+            if start is not None:
+                break
+        else:
+            noise_file = candidates[0]
+            start = (lengths[noise_file] - clean_len) // 2
+
+        uses[noise_file] += 1
+        speaker_uses[masker_speaker(noise_file)] += 1
+        intervals[noise_file].append((start, start + clean_len))
+        assignments[clean_file] = Assignment(clean_file, noise_file, start)
+
+    return [assignments[clean_file] for clean_file in clean_files]
+
+
+def save_schedule(path, assignments, seed=0):
+    with open(path, 'w') as f:
+        json.dump({'seed': seed, 'assignments': [a._asdict() for a in assignments]}, f, indent=1)
+
+
+def load_schedule(path):
+    with open(path) as f:
+        data = json.load(f)
+    return [Assignment(**a) for a in data['assignments']]
@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+import numpy as np
+
+MAX_INT16 = np.iinfo(np.int16).max
+MIN_INT16 = np.iinfo(np.int16).min
+
+MixedGrid = namedtuple('MixedGrid', ['mixed', 'noise_gains', 'clip_gains', 'pcm'], defaults=[None])
+
+
+def calculate_rms(amplitude):
+    """Calculate the RMS of the amplitude, accumulating in float64 whatever its dtype."""
+    return np.sqrt(np.mean(np.square(amplitude, dtype=np.float64), axis=-1))
+
+
+def calculate_adjusted_rms(clean_rms, snr):
+    """Calculate the noise RMS for one SNR or an array of SNRs."""
+    snr_factor = np.asarray(snr, dtype=np.float64) / 20
+    return clean_rms / (10 ** snr_factor)
+
+
+def snr_noise_gains(clean_rms, noise_rms, snr_list):
+    """Calculate the factor the noise is scaled by for every SNR in the list."""
+    return calculate_adjusted_rms(clean_rms, snr_list) / noise_rms
+
+
+def clip_safe_gains(mixed, peak_high=None, peak_low=None):
+    """Calculate the per-row gain that brings each mixture back into the int16 range."""
+    if peak_high is None:
+        peak_high = mixed.max(axis=-1)
+    if peak_low is None:
+        peak_low = mixed.min(axis=-1)
+    with np.errstate(divide='ignore'):
+        high_gain = np.where(peak_high > 0, MAX_INT16 / peak_high, np.inf)
+        low_gain = np.where(peak_low < 0, MIN_INT16 / peak_low, np.inf)
+    clipping = (peak_high > MAX_INT16) | (peak_low < MIN_INT16)
+    return np.where(clipping, np.minimum(high_gain, low_gain), 1.0)
+
+
+def mix_snr_grid(clean_amp, noise_amp, snr_list, clean_rms=None, noise_rms=None):
+    """Mix a clean signal with a noise segment at every SNR in one pass.
+
+    Returns a MixedGrid whose ``mixed`` array has one row per SNR, already
+    scaled so no row clips, together with the noise and clip gains used.
+    """
+    if clean_rms is None:
+        clean_rms = calculate_rms(clean_amp)
+    if noise_rms is None:
+        noise_rms = calculate_rms(noise_amp)
+
+    noise_gains = snr_noise_gains(clean_rms, noise_rms, snr_list)
+    mixed = noise_gains[:, np.newaxis] * noise_amp[np.newaxis, :]
+    mixed += clean_amp
+    clip_gains = clip_safe_gains(mixed)
+    mixed *= clip_gains[:, np.newaxis]
+    return MixedGrid(mixed, noise_gains, clip_gains)
+
+
+class MixKernel:
+    """Mix an SNR grid into preallocated buffers that are reused between calls.
+
+    Gain, sum, peak detection, clip gain and int16 quantization all write
+    into the kernel's own buffers, which only grow when a larger grid comes
+    along. Pass ``dtype=np.float32`` to halve the working memory. The source
+    arrays are never modified, but the returned arrays are overwritten by
+    the next call, so consume them first.
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self._work = np.empty(0, dtype=self.dtype)
+        self._pcm = np.empty(0, dtype=np.int16)
+        self._peak_high = np.empty(0, dtype=self.dtype)
+        self._peak_low = np.empty(0, dtype=self.dtype)
+
+    def _reserve(self, rows, length):
+        size = rows * length
+        if self._work.size < size:
+            self._work = np.empty(size, dtype=self.dtype)
+            self._pcm = np.empty(size, dtype=np.int16)
+        if self._peak_high.size < rows:
+            self._peak_high = np.empty(rows, dtype=self.dtype)
+            self._peak_low = np.empty(rows, dtype=self.dtype)
+        return (self._work[:size].reshape(rows, length), self._pcm[:size].reshape(rows, length),
+                self._peak_high[:rows], self._peak_low[:rows])
+
+    def mix(self, clean_amp, noise_amp, snr_list, clean_rms=None, noise_rms=None):
+        """Mix like mix_snr_grid, also returning the int16 mixtures in ``pcm``."""
+        if clean_rms is None:
+            clean_rms = calculate_rms(clean_amp)
+        if noise_rms is None:
+            noise_rms = calculate_rms(noise_amp)
+
+        noise_gains = snr_noise_gains(clean_rms, noise_rms, snr_list)
+        work, pcm, peak_high, peak_low = self._reserve(len(noise_gains), len(clean_amp))
+
+        np.multiply(noise_gains.astype(self.dtype)[:, np.newaxis], noise_amp, out=work)
+        np.add(work, clean_amp, out=work)
+        np.maximum.reduce(work, axis=1, out=peak_high)
+        np.minimum.reduce(work, axis=1, out=peak_low)
+        clip_gains = clip_safe_gains(work, peak_high, peak_low)
+        if (clip_gains != 1.0).any():
+            np.multiply(work, clip_gains.astype(self.dtype)[:, np.newaxis], out=work)
+        # truncates toward zero, same as astype(np.int16)
+        np.copyto(pcm, work, casting='unsafe')
+        return MixedGrid(work, noise_gains, clip_gains, pcm)
@@ -0,0 +1,58 @@
+import os
+from collections import OrderedDict
+
+from wav_reader import open_wav
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+class NoiseBank:
+    """Cache each masker's parsed header and int16 memory map, so a file is only opened once.
+
+    The samples are read-only maps (see wav_reader): the OS pages them in as
+    they are sliced and may drop them again, so callers convert only the
+    segment they mix to float. ``max_bytes`` limits the total size of the
+    files kept mapped, least-recently-used first; it is not a limit on
+    resident memory, and a map that is evicted stays valid for as long as a
+    caller still holds it.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return os.path.realpath(path) in self._entries
+
+    def get(self, path):
+        """Return (params, samples) for a masker, mapping it on first use."""
+        key = os.path.realpath(path)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = open_wav(path)
+        size = entry[1].nbytes
+        if size <= self.max_bytes:
+            self._entries[key] = entry
+            self.nbytes += size
+            self._evict()
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, (_, samples) = self._entries.popitem(last=False)
+            self.nbytes -= samples.nbytes
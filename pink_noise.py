@@ -0,0 +1,84 @@
+import random
+from functools import lru_cache
+
+import numpy as np
+
+HOP_SIZE = 32768
+PINK_RMS = 3000.0
+# below this the 1/f slope is flattened, so a long block does not pile its energy into rumble
+MIN_FREQUENCY = 20.0
+# stands in for a masker file name wherever a job is mixed against generated pink noise
+SYNTHETIC_PINK = '<synthetic pink noise>'
+
+
+@lru_cache(maxsize=8)
+def pink_spectrum(n_fft, framerate, rms=PINK_RMS):
+    """Magnitudes of a 1/f power spectrum over rfft bins, scaled so a shaped block has the given RMS.
+
+    A bin of complex noise, real and imaginary parts of unit variance, shaped
+    by h adds 4 h^2 / n^2 to the variance of irfft's output, or h^2 / n^2 for
+    the Nyquist bin, whose imaginary part irfft drops.
+    """
+    frequencies = np.fft.rfftfreq(n_fft, 1 / framerate)
+    spectrum = 1 / np.sqrt(np.maximum(frequencies, MIN_FREQUENCY))
+    spectrum[0] = 0.0
+    weights = np.full(len(spectrum), 4.0)
+    if n_fft % 2 == 0:
+        weights[-1] = 1.0
+    variance = np.sum(weights * np.square(spectrum)) / n_fft ** 2
+    spectrum *= rms / np.sqrt(variance)
+    spectrum.flags.writeable = False
+    return spectrum
+
+
+@lru_cache(maxsize=8)
+def overlap_window(n_fft):
+    """Sine window whose squares sum to one at 50% overlap, so overlapped blocks keep a constant variance."""
+    window = np.sin(np.pi * (np.arange(n_fft) + 0.5) / n_fft)
+    window.flags.writeable = False
+    return window
+
+
+class PinkNoise:
+    """Endless seeded pink noise at one sample rate, generated block by block.
+
+    Every block of ``2 * hop_size`` samples is complex Gaussian noise shaped
+    by the cached 1/f spectrum and brought back with one inverse FFT. Blocks
+    overlap by half and are joined with a sine window. Block k draws from
+    its own generator seeded with (seed, k), so any stretch of the stream
+    can be read directly, and reads of it always return the same samples.
+    """
+
+    def __init__(self, framerate, seed=None, hop_size=HOP_SIZE, rms=PINK_RMS):
+        self.framerate = framerate
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.hop_size = hop_size
+        self.spectrum = pink_spectrum(2 * hop_size, framerate, rms)
+        self.window = overlap_window(2 * hop_size)
+
+    def _block(self, k):
+        rng = np.random.default_rng((self.seed, k))
+        noise = rng.standard_normal((2, len(self.spectrum)))
+        block = np.fft.irfft(self.spectrum * (noise[0] + 1j * noise[1]), 2 * self.hop_size)
+        block *= self.window
+        return block
+
+    def blocks(self, start, length):
+        """Yield float64 chunks of at most hop_size samples covering exactly [start, start + length)."""
+        hop = self.hop_size
+        k, offset = divmod(start, hop)
+        block = self._block(k)
+        while length > 0:
+            next_block = self._block(k + 1)
+            chunk = block[hop:] + next_block[:hop]
+            chunk = chunk[offset:offset + length]
+            offset = 0
+            length -= len(chunk)
+            yield chunk
+            block = next_block
+            k += 1
+
+    def read(self, start, length):
+        """Return samples [start, start + length) of the stream as one float64 array."""
+        chunks = list(self.blocks(start, length))
+        return np.concatenate(chunks) if chunks else np.zeros(0)
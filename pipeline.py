@@ -0,0 +1,75 @@
+import queue
+import threading
+
+PIPELINE_DEPTH = 4
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _Failure:
+    """An exception raised in one stage, passed downstream in place of an item."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(outbox, item, stop):
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            pass
+
+
+def _drain(inbox, stop):
+    """Yield items from inbox until upstream is done; re-raise an upstream failure."""
+    while not stop.is_set():
+        try:
+            item = inbox.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def _run_stage(func, source, outbox, stop):
+    try:
+        for item in source:
+            _put(outbox, func(item), stop)
+    except BaseException as e:
+        _put(outbox, _Failure(e), stop)
+        return
+    _put(outbox, _DONE, stop)
+
+
+def run_pipeline(items, *stages, depth=PIPELINE_DEPTH):
+    """Pass items through stages, one thread per stage, and yield what the last stage returns, in order.
+
+    Stages are joined by queues of at most ``depth`` items, so a fast
+    stage runs ahead of a slow one by a bounded amount instead of holding
+    every file in memory. Disk reads and writes release the GIL, as do the
+    larger NumPy operations, so a reader, a compute and a writer stage
+    overlap within one process. An exception in any stage stops the
+    pipeline and is raised here; closing the generator early stops it too.
+    """
+    stop = threading.Event()
+    threads = []
+    source = iter(items)
+    for func in stages:
+        outbox = queue.Queue(depth)
+        threads.append(threading.Thread(target=_run_stage, args=(func, source, outbox, stop), daemon=True))
+        source = _drain(outbox, stop)
+
+    for thread in threads:
+        thread.start()
+    try:
+        yield from source
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
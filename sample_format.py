@@ -0,0 +1,163 @@
+import argparse
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from wav_reader import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, read_format
+
+BLOCK_FRAMES = 65536
+
+SampleFormat = namedtuple('SampleFormat', ['name', 'format_tag', 'bits'])
+FORMATS = {
+    'u8': SampleFormat('u8', WAVE_FORMAT_PCM, 8),
+    'i16': SampleFormat('i16', WAVE_FORMAT_PCM, 16),
+    'i24': SampleFormat('i24', WAVE_FORMAT_PCM, 24),
+    'i32': SampleFormat('i32', WAVE_FORMAT_PCM, 32),
+    'f32': SampleFormat('f32', WAVE_FORMAT_IEEE_FLOAT, 32),
+}
+
+
+def sample_format(format_tag, bits):
+    """Look up the SampleFormat of a fmt chunk, or raise ValueError for anything we cannot convert."""
+    for fmt in FORMATS.values():
+        if fmt.format_tag == format_tag and fmt.bits == bits:
+            return fmt
+    raise ValueError(f"unsupported sample format {format_tag:#x} with {bits} bits")
+
+
+def decode(data, fmt):
+    """Convert raw little-endian sample bytes to float64 in [-1, 1)."""
+    if fmt.name == 'u8':
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float64) - 128) / 128
+    if fmt.name == 'i16':
+        return np.frombuffer(data, dtype='<i2') / 32768
+    if fmt.name == 'i24':
+        # place the three bytes in the top of an int32 so the shift sign-extends them
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        wide = np.zeros((len(raw), 4), dtype=np.uint8)
+        wide[:, 1:] = raw
+        return (wide.view('<i4').ravel() >> 8) / 8388608
+    if fmt.name == 'i32':
+        return np.frombuffer(data, dtype='<i4') / 2147483648
+    return np.frombuffer(data, dtype='<f4').astype(np.float64)
+
+
+def encode(samples, fmt):
+    """Convert float64 samples in [-1, 1) to raw little-endian bytes, rounding and clipping integer formats."""
+    if fmt.name == 'f32':
+        return samples.astype('<f4').tobytes()
+
+    full_scale = 2 ** (fmt.bits - 1)
+    scaled = np.clip(np.rint(samples * full_scale), -full_scale, full_scale - 1)
+    if fmt.name == 'u8':
+        return (scaled + 128).astype(np.uint8).tobytes()
+    if fmt.name == 'i16':
+        return scaled.astype('<i2').tobytes()
+    if fmt.name == 'i24':
+        return scaled.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return scaled.astype('<i4').tobytes()
+
+
+def wav_header(fmt, nchannels, framerate, nframes):
+    """Build the RIFF, fmt and data chunk headers for a file of nframes frames."""
+    block_align = nchannels * fmt.bits // 8
+    data_size = nframes * block_align
+    fmt_chunk = struct.pack('<HHIIHH', fmt.format_tag, nchannels, framerate, framerate * block_align, block_align,
+                            fmt.bits)
+    extra = b''
+    if fmt.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        # non-PCM formats carry a cbSize field and a fact chunk with the frame count
+        fmt_chunk += struct.pack('<H', 0)
+        extra = struct.pack('<4sII', b'fact', 4, nframes)
+    riff_size = 4 + 8 + len(fmt_chunk) + len(extra) + 8 + data_size + (data_size & 1)
+    return (struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE') + struct.pack('<4sI', b'fmt ', len(fmt_chunk))
+            + fmt_chunk + extra + struct.pack('<4sI', b'data', data_size))
+
+
+def convert_file(path, target='i16', output_path=None, block_frames=BLOCK_FRAMES):
+    """Convert one WAV file to the target format block by block; returns True if it was rewritten.
+
+    The result is written to a temporary file next to the output and renamed
+    over it only once complete, so converting in place never leaves a
+    half-written file behind.
+    """
+    target = FORMATS[target]
+    layout = read_format(path)
+    source = sample_format(layout.format_tag, layout.bits)
+    if output_path is None:
+        if source == target:
+            return False
+        output_path = path
+
+    nframes = layout.data_size // layout.block_align
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(wav_header(target, layout.nchannels, layout.framerate, nframes))
+            src.seek(layout.data_offset)
+            remaining = layout.data_size
+            while remaining:
+                data = src.read(min(remaining, block_frames * layout.block_align))
+                if not data:
+                    raise ValueError(f"{path} ends before its data chunk does")
+                remaining -= len(data)
+                dst.write(encode(decode(data, source), target))
+            if (nframes * layout.nchannels * target.bits // 8) & 1:
+                dst.write(b'\0')
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def wav_files(paths):
+    """Expand files and directory trees into a sorted list of .wav paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                files.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith('.wav'))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def _convert_task(task):
+    path, target = task
+    try:
+        return path, convert_file(path, target), None
+    except (OSError, ValueError) as e:
+        return path, False, str(e)
+
+
+def convert_tree(paths, target='i16', workers=None):
+    """Convert every WAV file under paths in a process pool; returns (converted, unchanged, failed) counts."""
+    counts = [0, 0, 0]
+    tasks = [(path, target) for path in wav_files(paths)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, converted, error in executor.map(_convert_task, tasks, chunksize=4):
+            if error is not None:
+                print(f"Failed to convert {path}: {error}")
+                counts[2] += 1
+            elif converted:
+                print(f"Converted and replaced {path}")
+                counts[0] += 1
+            else:
+                print(f"{path} is already {target}.")
+                counts[1] += 1
+    return tuple(counts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert WAV files in place to another sample format.")
+    parser.add_argument('paths', nargs='*', default=['.'], help="WAV files or directories to convert recursively")
+    parser.add_argument('--to', dest='target', choices=sorted(FORMATS), default='i16')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    converted, unchanged, failed = convert_tree(args.paths, args.target, args.workers)
+    print(f"Converted {converted}, left {unchanged} unchanged, {failed} failed")
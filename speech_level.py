@@ -0,0 +1,59 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# frame, smoothing and hangover lengths of the activity envelope, after ITU-T P.56
+FRAME_SECONDS = 0.01
+SMOOTH_FRAMES = 3
+HANGOVER_FRAMES = 20
+ACTIVITY_MARGIN_DB = 15.9
+LEVELS = ('rms', 'active')
+
+
+def frame_length(framerate, nchannels=1):
+    """Number of interleaved samples in one activity frame."""
+    return max(1, round(framerate * FRAME_SECONDS)) * nchannels
+
+
+def frame_energies(amplitude, length):
+    """Sum of squares of every whole frame of length samples; a trailing partial frame is dropped."""
+    count = len(amplitude) // length
+    frames = np.asarray(amplitude[:count * length], dtype=np.float64).reshape(count, length)
+    return np.einsum('ij,ij->i', frames, frames)
+
+
+def activity_envelope(energies):
+    """Smooth frame energies over SMOOTH_FRAMES and hold every peak for HANGOVER_FRAMES."""
+    cumulative = np.concatenate(([0.0], np.cumsum(energies)))
+    ends = np.arange(1, len(energies) + 1)
+    starts = np.maximum(ends - SMOOTH_FRAMES, 0)
+    smoothed = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+    padded = np.concatenate((np.zeros(HANGOVER_FRAMES), smoothed))
+    return sliding_window_view(padded, HANGOVER_FRAMES + 1).max(axis=1)
+
+
+def level_from_energies(energies, length, margin_db=ACTIVITY_MARGIN_DB):
+    """Active level (an RMS) of a signal given its frame energies, or None if it has no frames.
+
+    Every envelope value is a candidate threshold. Sorting the frames by
+    envelope and taking a cumulative sum of their energies gives the mean
+    square of the active frames for all thresholds at once; the level is the
+    one for the highest threshold that sits margin_db below it.
+    """
+    if len(energies) == 0:
+        return None
+    envelope = activity_envelope(energies)
+    order = np.argsort(envelope, kind='stable')[::-1]
+    thresholds = envelope[order] / length
+    levels = np.cumsum(energies[order]) / (length * np.arange(1, len(energies) + 1))
+    hits = np.flatnonzero(levels >= thresholds * 10 ** (margin_db / 10))
+    mean_square = levels[hits[0]] if len(hits) else levels[-1]
+    return float(np.sqrt(mean_square))
+
+
+def active_speech_level(amplitude, framerate, nchannels=1):
+    """RMS of the active parts of a signal, so leading and trailing silence do not lower it."""
+    length = frame_length(framerate, nchannels)
+    level = level_from_energies(frame_energies(amplitude, length), length)
+    if level is None:
+        return float(np.sqrt(np.mean(np.square(amplitude, dtype=np.float64)))) if len(amplitude) else 0.0
+    return level
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'nbytes', 'samples', 'start')
+
+    def __init__(self, timer, name, nbytes, samples):
+        self.timer = timer
+        self.name = name
+        self.nbytes = nbytes
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter_ns() - self.start, self.nbytes, self.samples)
+
+
+class _NullStage:
+    __slots__ = ('nbytes', 'samples')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullTimer:
+    """Timer that records nothing; the default for the mixers."""
+
+    _stage = _NullStage()
+
+    def stage(self, name, nbytes=0, samples=0):
+        return self._stage
+
+    def begin_file(self, path):
+        pass
+
+    def end_file(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    """Record wall time, bytes and samples per stage and per file.
+
+    Use ``with timer.stage('decode') as stage:`` around a stage and set
+    ``stage.nbytes`` / ``stage.samples`` inside it once they are known.
+    Stages of the current file are buffered and written as JSON lines to
+    ``trace_path`` in one append when the file ends, so several worker
+    processes can share one trace file.
+    """
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.totals = {}
+        self._file = None
+        self._lines = []
+
+    def stage(self, name, nbytes=0, samples=0):
+        return _Stage(self, name, nbytes, samples)
+
+    def record(self, name, elapsed_ns, nbytes, samples):
+        total = self.totals.get(name)
+        if total is None:
+            total = self.totals[name] = [0, 0, 0, 0]
+        total[0] += elapsed_ns
+        total[1] += nbytes
+        total[2] += samples
+        total[3] += 1
+        if self.trace_path is not None:
+            self._lines.append((self._file, name, elapsed_ns, nbytes, samples))
+
+    def begin_file(self, path):
+        self.end_file()
+        self._file = path
+
+    def end_file(self):
+        if self._lines:
+            pid = os.getpid()
+            text = ''.join(json.dumps(trace_record(file, name, elapsed_ns, nbytes, samples, pid)) + '\n'
+                           for file, name, elapsed_ns, nbytes, samples in self._lines)
+            with open(self.trace_path, 'a') as f:
+                f.write(text)
+            self._lines = []
+        self._file = None
+
+    def summary(self):
+        return {name: summary_record(*total) for name, total in self.totals.items()}
+
+
+def trace_record(file, stage, elapsed_ns, nbytes, samples, pid):
+    seconds = elapsed_ns / 1e9
+    return {
+        'file': file,
+        'stage': stage,
+        'seconds': seconds,
+        'bytes': nbytes,
+        'samples': samples,
+        'samples_per_s': samples / seconds if seconds else None,
+        'pid': pid,
+    }
+
+
+def summary_record(elapsed_ns, nbytes, samples, count):
+    seconds = elapsed_ns / 1e9
+    return {
+        'seconds': seconds,
+        'calls': count,
+        'bytes': nbytes,
+        'samples': samples,
+        'mb_per_s': nbytes / seconds / 1e6 if seconds else None,
+        'samples_per_s': samples / seconds if seconds else None,
+    }
+
+
+def summarize_trace(trace_path, offset=0):
+    """Add up a JSON-lines trace, e.g. one written by several workers, per stage.
+
+    Only the lines from byte offset on are counted, so a run can summarize
+    what it appended to a trace that earlier runs wrote to as well.
+    """
+    totals = {}
+    with open(trace_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            record = json.loads(line)
+            total = totals.setdefault(record['stage'], [0, 0, 0, 0])
+            total[0] += round(record['seconds'] * 1e9)
+            total[1] += record['bytes']
+            total[2] += record['samples']
+            total[3] += 1
+    return {name: summary_record(*total) for name, total in totals.items()}
+
+
+def print_summary(summary):
+    wall = sum(record['seconds'] for record in summary.values())
+    for name, record in sorted(summary.items(), key=lambda item: -item[1]['seconds']):
+        share = record['seconds'] / wall * 100 if wall else 0.0
+        rate = f"{record['samples_per_s'] / 1e6:8.1f} Msamples/s" if record['samples_per_s'] else ''
+        print(f"{name:12s} {record['seconds']:9.3f} s {share:5.1f}%  {record['calls']:7d} calls  {rate}")
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from corpus_catalog import CorpusCatalog
+from stimulus_names import STIMULUS_NAME
+from wav_reader import WavParams, open_wav, read_layout
+
+BANK_MAGIC = b'SNRBANK1'
+BANK_ALIGN = 64
+PACK_BLOCK_SIZE = 1024 * 1024
+
+# offset and length count int16 samples into the blob; snr and mode are None for clean words
+BankEntry = namedtuple('BankEntry', ['name', 'word', 'snr', 'mode', 'offset', 'length', 'framerate', 'nchannels'])
+
+
+def parse_name(name):
+    """Split a stimulus name like PinkNoise_SNR_-2_dB_rich.wav into (word, snr, mode)."""
+    match = STIMULUS_NAME.match(os.path.basename(name))
+    if match is None:
+        return os.path.splitext(os.path.basename(name))[0], None, None
+    snr = float(match.group('snr')) if match.group('snr') is not None else None
+    return match.group('word'), snr, match.group('mode')
+
+
+def pack_bank(bank_path, dirs, root='.'):
+    """Pack every WAV file under dirs (relative to root) into one bank file and return its entries.
+
+    The bank is a small header, a JSON index and one contiguous int16 blob.
+    Entry names are the files' paths relative to root, so a bank of
+    GeneratedSNR answers ``listing('PinkNoise')`` like a catalog of it would.
+    """
+    catalog = CorpusCatalog(root, {directory.replace(os.sep, '/'): 'bank' for directory in dirs})
+    catalog.update()
+
+    # the index is written first, so lay out the blob from the headers alone
+    entries = []
+    paths = catalog.paths()
+    offset = 0
+    for path in paths:
+        layout = read_layout(path)
+        if layout.params.sampwidth != 2:
+            raise ValueError(f"{path} is not 16-bit PCM; convert it with sample_format.py first")
+        name = os.path.relpath(path, root).replace(os.sep, '/')
+        word, snr, mode = parse_name(name)
+        length = layout.data_size // 2
+        entries.append(BankEntry(name, word, snr, mode, offset, length, layout.params.framerate,
+                                 layout.params.nchannels))
+        offset += length
+
+    index = json.dumps({'entries': [list(entry) for entry in entries]}, separators=(',', ':')).encode('utf-8')
+    header = BANK_MAGIC + struct.pack('<I', len(index)) + index
+    header += b'\0' * (-len(header) % BANK_ALIGN)
+
+    tmp_path = bank_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for path in paths:
+            _, samples = open_wav(path)
+            for block_start in range(0, len(samples), PACK_BLOCK_SIZE):
+                f.write(samples[block_start:block_start + PACK_BLOCK_SIZE].astype('<i2', copy=False).tobytes())
+    os.replace(tmp_path, bank_path)
+    return entries
+
+
+class StimulusBank:
+    """Read-only view of a packed bank: one memory map, int16 views per entry.
+
+    ``get`` has the same shape as ``NoiseBank.get`` and ``open_wav``, so a
+    bank can stand in for a noise bank or a directory of clean words.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(len(BANK_MAGIC))
+            if magic != BANK_MAGIC:
+                raise ValueError(f"{path} is not a stimulus bank")
+            index_size, = struct.unpack('<I', f.read(4))
+            index = json.loads(f.read(index_size))
+        data_offset = len(BANK_MAGIC) + 4 + index_size
+        data_offset += -data_offset % BANK_ALIGN
+
+        self.entries = {entry[0]: BankEntry(*entry) for entry in index['entries']}
+        count = (os.path.getsize(path) - data_offset) // 2
+        self.samples = np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=(count,)) if count else \
+            np.zeros(0, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def get(self, name):
+        """Return (params, samples) for an entry, samples being a zero-copy view of the blob."""
+        entry = self.entries[name]
+        params = WavParams(entry.nchannels, 2, entry.framerate, entry.length // entry.nchannels, 'NONE',
+                           'not compressed')
+        return params, self.samples[entry.offset:entry.offset + entry.length]
+
+    def select(self, word=None, snr=None, mode=None):
+        """Entries matching every given field, in name order."""
+        return [entry for name, entry in sorted(self.entries.items())
+                if (word is None or entry.word == word) and (snr is None or entry.snr == snr)
+                and (mode is None or entry.mode == mode)]
+
+    def listing(self, directory):
+        """Names of the entries directly in directory, sorted, as CorpusCatalog.listing would list them."""
+        directory = os.path.normpath(directory).replace(os.sep, '/')
+        return sorted(name for name in self.entries if os.path.dirname(name) == directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack stimulus folders into one bank file.")
+    parser.add_argument('bank', help="bank file to write, e.g. GeneratedSNR/stimuli.bank")
+    parser.add_argument('dirs', nargs='+', help="folders to pack, relative to --root")
+    parser.add_argument('--root', default='.')
+    args = parser.parse_args()
+    packed = pack_bank(args.bank, args.dirs, args.root)
+    print(f"Packed {len(packed)} files into {args.bank}")
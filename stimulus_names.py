@@ -0,0 +1,4 @@
+import re
+
+# <mode>_SNR_<snr>_dB_<word>.wav for mixed stimuli, <word>.wav for clean words; mode and snr are None for the latter
+STIMULUS_NAME = re.compile(r'^(?:(?P<mode>[A-Za-z]+)_SNR_(?P<snr>-?\d+(?:\.\d+)?)_dB_)?(?P<word>[^_]+)\.(?:wav|mp3)$')
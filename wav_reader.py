@@ -0,0 +1,88 @@
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# same fields as wave.Wave_read.getparams(), so it can be passed to setparams
+WavParams = namedtuple('WavParams', ['nchannels', 'sampwidth', 'framerate', 'nframes', 'comptype', 'compname'])
+WavLayout = namedtuple('WavLayout', ['params', 'data_offset', 'data_size'])
+# format_tag is the sub-format for WAVE_FORMAT_EXTENSIBLE files
+WavFormat = namedtuple('WavFormat', ['format_tag', 'nchannels', 'framerate', 'block_align', 'bits', 'data_offset',
+                                     'data_size'])
+
+
+def read_format(path):
+    """Walk the RIFF chunks of a WAV file and locate its fmt and data chunks, whatever the sample format."""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            chunk_start = f.tell()
+
+            if chunk_id == b'fmt ':
+                fmt_chunk = f.read(chunk_size)
+                fmt = struct.unpack('<HHIIHH', fmt_chunk[:16])
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(fmt_chunk) >= 26:
+                    fmt = struct.unpack('<H', fmt_chunk[24:26]) + fmt[1:]
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{path} has a data chunk before its fmt chunk")
+                # streamed writers leave the size at 0 or 0xFFFFFFFF
+                data_size = min(chunk_size, file_size - chunk_start) if chunk_size else file_size - chunk_start
+                break
+
+            f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+    format_tag, nchannels, framerate, _, block_align, bits = fmt
+    return WavFormat(format_tag, nchannels, framerate, block_align, bits, chunk_start,
+                     data_size // block_align * block_align)
+
+
+def read_layout(path):
+    """Locate the data chunk of a 16-bit PCM WAV file."""
+    fmt = read_format(path)
+    if fmt.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) or fmt.bits != 16:
+        raise ValueError(f"{path}: only 16-bit PCM is supported (format {fmt.format_tag:#x}, {fmt.bits} bits)")
+
+    nframes = fmt.data_size // fmt.block_align
+    params = WavParams(fmt.nchannels, fmt.bits // 8, fmt.framerate, nframes, 'NONE', 'not compressed')
+    return WavLayout(params, fmt.data_offset, fmt.data_size)
+
+
+def open_wav(path):
+    """Return (params, samples) with samples a read-only int16 memmap of the data chunk.
+
+    No sample data is read until the array is indexed, so slicing a short
+    segment out of a long masker only touches the pages of that segment.
+    """
+    layout = read_layout(path)
+    count = layout.data_size // 2
+    if count == 0:
+        samples = np.zeros(0, dtype=np.int16)
+        samples.flags.writeable = False
+    else:
+        samples = np.memmap(path, dtype='<i2', mode='r', offset=layout.data_offset, shape=(count,))
+    return layout.params, samples
+
+
+def read_amplitude(path, bank=None, dtype=np.float64):
+    """Read a whole WAV file as float (float64 by default), converting straight from the mapped int16 data.
+
+    With a bank (a NoiseBank or StimulusBank) the samples come from its
+    ``get`` instead of the file system.
+    """
+    params, samples = bank.get(path) if bank is not None else open_wav(path)
+    return params, samples.astype(dtype)
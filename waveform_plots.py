@@ -0,0 +1,164 @@
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from stimulus_names import STIMULUS_NAME
+from wav_reader import open_wav
+
+PLOT_WIDTH_PX = 1000
+DPI = 100
+
+_pyplot = None
+
+
+def pyplot():
+    """Import matplotlib.pyplot on first use, with the headless Agg backend."""
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot
+        _pyplot = matplotlib.pyplot
+    return _pyplot
+
+
+def minmax_envelope(amplitude, framerate, n_bins=PLOT_WIDTH_PX):
+    """Reduce a signal to per-pixel (time, min, max) columns, which draw the same as every sample."""
+    amplitude = np.asarray(amplitude)
+    if len(amplitude) <= 2 * n_bins:
+        times = np.arange(len(amplitude)) / framerate
+        return times, amplitude, amplitude
+
+    bin_size = math.ceil(len(amplitude) / n_bins)
+    n_full = len(amplitude) // bin_size
+    body = amplitude[:n_full * bin_size].reshape(n_full, bin_size)
+    low = body.min(axis=1)
+    high = body.max(axis=1)
+    tail = amplitude[n_full * bin_size:]
+    if len(tail):
+        low = np.append(low, tail.min())
+        high = np.append(high, tail.max())
+    times = (np.arange(len(low)) * bin_size + bin_size / 2) / framerate
+    return times, low, high
+
+
+def _draw(ax, envelope, title, color):
+    times, low, high = envelope
+    ax.fill_between(times, low, high, color=color, linewidth=0.5, edgecolor=color, label=title)
+    ax.set_title(title)
+    ax.set_ylabel('Amplitude')
+
+
+def render_waveform_plot(task):
+    """Draw stacked envelope panels into one PNG; task is (output_path, [(title, envelope, color), ...])."""
+    output_path, panels = task
+    plt = pyplot()
+    fig, axs = plt.subplots(len(panels), 1, figsize=(PLOT_WIDTH_PX / DPI, 8), dpi=DPI, squeeze=False)
+    for ax, (title, envelope, color) in zip(axs[:, 0], panels):
+        _draw(ax, envelope, title, color)
+        ax.legend()
+    axs[-1, 0].set_xlabel('Time (seconds)')
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close(fig)
+    return output_path
+
+
+def render_contact_sheet(task):
+    """Draw one small envelope panel per file into one PNG; task is (output_path, title, [(name, envelope)])."""
+    output_path, title, panels = task
+    plt = pyplot()
+    columns = min(6, len(panels))
+    rows = math.ceil(len(panels) / columns)
+    fig, axs = plt.subplots(rows, columns, figsize=(2.5 * columns, 1.6 * rows), dpi=DPI, squeeze=False,
+                            sharey=True)
+    for ax, (name, envelope) in zip(axs.flat, panels):
+        times, low, high = envelope
+        ax.fill_between(times, low, high, color='green', linewidth=0.5, edgecolor='green')
+        ax.set_title(name, fontsize=8)
+        ax.tick_params(labelsize=6)
+    for ax in axs.flat[len(panels):]:
+        ax.axis('off')
+    fig.suptitle(title)
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close(fig)
+    return output_path
+
+
+class WaveformPlotter:
+    """Render waveform plots in worker processes.
+
+    Signals are reduced to min/max envelopes in the calling process, so only
+    a few thousand points per panel are sent to the workers. With
+    ``workers=0`` plots are rendered inline, which is what a process that is
+    already a pool worker should use.
+    """
+
+    def __init__(self, workers=None, n_bins=PLOT_WIDTH_PX):
+        self.n_bins = n_bins
+        self._executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        self._futures = []
+
+    def submit(self, output_path, framerate, signals):
+        """Queue a stacked plot of [(title, amplitude, color), ...]."""
+        panels = [(title, minmax_envelope(amplitude, framerate, self.n_bins), color)
+                  for title, amplitude, color in signals]
+        if self._executor is None:
+            render_waveform_plot((output_path, panels))
+        else:
+            self._futures.append(self._executor.submit(render_waveform_plot, (output_path, panels)))
+
+    def close(self):
+        for future in self._futures:
+            print(f"Saved waveform plot as {future.result()}")
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def contact_sheet_tasks(generated_dir, n_bins=PLOT_WIDTH_PX // 6):
+    """Group generated outputs by directory and SNR and build one contact-sheet task per group."""
+    groups = {}
+    for dirpath, _, filenames in os.walk(generated_dir):
+        for filename in sorted(filenames):
+            match = STIMULUS_NAME.match(filename)
+            # only mixed outputs; clean words have no mode
+            if match and match.group('mode') and filename.endswith('.wav'):
+                key = (dirpath, match.group('mode'), match.group('snr'))
+                groups.setdefault(key, []).append((match.group('word'), os.path.join(dirpath, filename)))
+
+    tasks = []
+    for (dirpath, mode, snr), files in sorted(groups.items()):
+        panels = []
+        for word, path in files:
+            params, samples = open_wav(path)
+            panels.append((word, minmax_envelope(samples, params.framerate, n_bins)))
+        label = os.path.relpath(dirpath, generated_dir)
+        output_path = os.path.join(dirpath, f"{mode}_SNR_{snr}_dB_contact_sheet.png")
+        tasks.append((output_path, f"{label} - {mode} {snr} dB", panels))
+    return tasks
+
+
+def render_contact_sheets(generated_dir, workers=None):
+    tasks = contact_sheet_tasks(generated_dir)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for output_path in executor.map(render_contact_sheet, tasks):
+            print(f"Saved contact sheet as {output_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render one contact sheet per speaker and SNR of generated stimuli.")
+    parser.add_argument('generated_dir', nargs='?', default='GeneratedSNR')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    render_contact_sheets(args.generated_dir, args.workers)